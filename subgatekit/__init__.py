@@ -1,7 +1,32 @@
-from .client import SubgateClient, AsyncSubgateClient
+from .client import (
+    SubgateClient,
+    AsyncSubgateClient,
+    TransportConfig,
+    RetryPolicy,
+    RetryBudget,
+    CircuitBreakerPolicy,
+    CircuitState,
+    RateLimit,
+    JsonCodec,
+    StdlibJsonCodec,
+    OrjsonCodec,
+    MsgspecCodec,
+    BulkResult,
+    BulkItemResult,
+    UpdateStats,
+    CachePolicy,
+    CacheStats,
+    CacheInvalidator,
+    SyncUsageAggregator,
+    AsyncUsageAggregator,
+    SyncWriteSpool,
+    AsyncWriteSpool,
+)
 from .entities import (
     BillingInfo,
     Discount,
+    PartialPlan,
+    PartialSubscription,
     Plan,
     PlanInfo,
     Subscription,
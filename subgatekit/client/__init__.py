@@ -1 +1,12 @@
 from .client import SubgateClient, AsyncSubgateClient
+from .bulk import BulkResult, BulkItemResult
+from .cache import CachePolicy, CacheStats
+from .change_tracking import UpdateStats
+from .circuit_breaker import CircuitBreakerPolicy, CircuitState
+from .codecs import JsonCodec, StdlibJsonCodec, OrjsonCodec, MsgspecCodec
+from .invalidation import CacheInvalidator
+from .rate_limiter import RateLimit
+from .retry import RetryPolicy, RetryBudget
+from .spool import SyncWriteSpool, AsyncWriteSpool
+from .transport import TransportConfig
+from .usage_aggregator import SyncUsageAggregator, AsyncUsageAggregator
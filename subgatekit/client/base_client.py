@@ -1,40 +1,345 @@
-from typing import Optional
+import asyncio
+import time
+from typing import Optional, Any, Iterator, AsyncIterator, Callable
 
 import httpx
 
-from subgatekit.client.services import processing_response
+from subgatekit.client.circuit_breaker import CircuitBreakerPolicy, CircuitBreaker
+from subgatekit.client.codecs import JsonCodec, StdlibJsonCodec
+from subgatekit.client.rate_limiter import RateLimit
+from subgatekit.client.retry import RetryPolicy, is_throttled
+from subgatekit.client.services import (processing_response, processing_conditional_response, get_retry_after,
+                                         build_conditional_headers, ConditionalResponse)
+from subgatekit.client.single_flight import SyncSingleFlight, AsyncSingleFlight
+from subgatekit.client.streaming import JsonArrayParser
+from subgatekit.client.transport import TransportConfig
+from subgatekit.exceptions import ItemAlreadyExist
 
 
 class BaseClient:
 
-    def __init__(self, base_url: str, apikey: str):
+    def __init__(
+            self,
+            base_url: str,
+            apikey: str,
+            transport: TransportConfig = None,
+            retry: RetryPolicy = None,
+            circuit_breaker: CircuitBreakerPolicy = None,
+            rate_limit: RateLimit = None,
+            single_flight: bool = False,
+            codec: JsonCodec = None,
+    ):
         self._base_url = base_url
         self._apikey = apikey
+        self._transport = transport if transport else TransportConfig()
+        self._retry = retry if retry else RetryPolicy.disabled()
+        self._circuit_breaker = circuit_breaker
+        self._rate_limit = rate_limit
+        self._codec = codec if codec else StdlibJsonCodec()
         self._headers = {
             "X-API-Key": f"{apikey}",
             "Content-Type": "application/json",
         }
+        self._client = self._create_client()
+        self._single_flight = self._create_single_flight() if single_flight else None
+
+    def _create_client(self):
+        raise NotImplementedError
+
+    def _create_single_flight(self):
+        raise NotImplementedError
+
+    def _encode_body(self, kwargs: dict) -> None:
+        if "json" in kwargs:
+            kwargs["content"] = self._codec.encode(kwargs.pop("json"))
+
+    def _build_headers(self, headers: dict, idempotency_key: Optional[str]) -> dict:
+        result = {**self._headers, **headers}
+        if idempotency_key is not None:
+            result["Idempotency-Key"] = idempotency_key
+        return result
+
+    @property
+    def circuit_breaker(self) -> Optional[CircuitBreakerPolicy]:
+        return self._circuit_breaker
+
+    @property
+    def codec(self) -> JsonCodec:
+        return self._codec
+
+    def _get_breaker(self, method: str, route: str) -> Optional[CircuitBreaker]:
+        if self._circuit_breaker is None:
+            return None
+        return self._circuit_breaker.get(method, route)
+
+    def _before_attempt(self, breaker: Optional[CircuitBreaker], route: str) -> float:
+        if breaker is not None:
+            breaker.before_request()
+        if self._rate_limit is None:
+            return 0.0
+        return self._rate_limit.reserve(route)
+
+    def _after_attempt(self, breaker: Optional[CircuitBreaker], route: str, exc: Exception = None) -> None:
+        if self._rate_limit is not None and is_throttled(exc):
+            retry_after = get_retry_after(exc.response)
+            self._rate_limit.block(route, retry_after if retry_after is not None else 1.0)
+        if breaker is None:
+            return
+        if exc is None:
+            breaker.record_success()
+        elif breaker.is_failure(exc):
+            breaker.record_failure()
+        else:
+            # A 4xx or a decoding error says nothing about the endpoint health, so it neither closes nor opens
+            breaker.release()
+
+    @staticmethod
+    def _release_attempt(breaker: Optional[CircuitBreaker]) -> None:
+        if breaker is not None:
+            breaker.release()
+
+    @staticmethod
+    def _single_flight_key(method: str, url: str, headers: dict, kwargs: dict) -> Optional[str]:
+        # Only plain GETs are shared; anything carrying a body or custom headers goes out on its own
+        if method.upper() != "GET" or headers or set(kwargs) - {"params"}:
+            return None
+        return str(httpx.URL(url, params=kwargs.get("params")))
+
+    @staticmethod
+    def _is_landed_write(exc: Exception, attempt: int, idempotency_key: Optional[str]) -> bool:
+        # A retried write that conflicts with its own entity id means the previous attempt has succeeded
+        if attempt == 1 or idempotency_key is None or not isinstance(exc, ItemAlreadyExist):
+            return False
+        return str(exc.index_value) == idempotency_key.split(":")[0]
 
 
 class SyncBaseClient(BaseClient):
-    def __init__(self, base_url: str, apikey: str):
-        super().__init__(base_url, apikey)
-        self._client = httpx.Client(headers=self._headers, follow_redirects=True)
+    def _create_client(self) -> httpx.Client:
+        return httpx.Client(
+            headers=self._headers,
+            follow_redirects=True,
+            **self._transport.client_kwargs(),
+        )
 
-    def request(self, method: str, endpoint: str, **kwargs) -> Optional[dict]:
+    def _create_single_flight(self) -> SyncSingleFlight:
+        return SyncSingleFlight()
+
+    def request(
+            self,
+            method: str,
+            endpoint: str,
+            idempotency_key: str = None,
+            route: str = None,
+            **kwargs,
+    ) -> Optional[dict]:
+        url = f"{self._base_url}{endpoint}"
+        extra_headers = kwargs.pop("headers", {})
+        headers = self._build_headers(extra_headers, idempotency_key)
+        self._encode_body(kwargs)
+        route = route if route else endpoint
+        key = None
+        if self._single_flight is not None:
+            key = self._single_flight_key(method, url, extra_headers, kwargs)
+        if key is not None:
+            return self._single_flight.do(
+                key, lambda: self._send(method, url, headers, idempotency_key, route, kwargs),
+            )
+        return self._send(method, url, headers, idempotency_key, route, kwargs)
+
+    def conditional_request(
+            self,
+            method: str,
+            endpoint: str,
+            etag: str = None,
+            last_modified: str = None,
+            route: str = None,
+            **kwargs,
+    ) -> ConditionalResponse:
+        url = f"{self._base_url}{endpoint}"
+        headers = self._build_headers(build_conditional_headers(etag, last_modified), None)
+        self._encode_body(kwargs)
+        route = route if route else endpoint
+        return self._send(method, url, headers, None, route, kwargs, processing_conditional_response)
+
+    def _send(
+            self,
+            method: str,
+            url: str,
+            headers: dict,
+            idempotency_key: Optional[str],
+            route: str,
+            kwargs: dict,
+            handler: Callable[[httpx.Response, JsonCodec], Any] = processing_response,
+    ) -> Any:
+        breaker = self._get_breaker(method, route)
+        self._retry.record_request()
+        attempt = 1
+        while True:
+            delay = self._before_attempt(breaker, route)
+            try:
+                if delay > 0:
+                    time.sleep(delay)
+                response = self._client.request(method, url, headers=headers, **kwargs)
+                result = handler(response, self._codec)
+            except Exception as exc:
+                self._after_attempt(breaker, route, exc)
+                if self._is_landed_write(exc, attempt, idempotency_key):
+                    return None
+                if not self._retry.should_retry(method, attempt, exc, idempotency_key is not None):
+                    raise
+                delay = self._retry.backoff(attempt, exc)
+            except BaseException:
+                self._release_attempt(breaker)
+                raise
+            else:
+                self._after_attempt(breaker, route)
+                return result
+            time.sleep(delay)
+            attempt += 1
+
+    def stream(self, method: str, endpoint: str, route: str = None, **kwargs) -> Iterator[Any]:
         url = f"{self._base_url}{endpoint}"
-        headers = {**self._headers, **kwargs.pop("headers", {})}
-        response = self._client.request(method, url, headers=headers, **kwargs)
-        return processing_response(response)
+        headers = self._build_headers(kwargs.pop("headers", {}), None)
+        self._encode_body(kwargs)
+        route = route if route else endpoint
+        breaker = self._get_breaker(method, route)
+        delay = self._before_attempt(breaker, route)
+        parser = JsonArrayParser()
+        try:
+            if delay > 0:
+                time.sleep(delay)
+            with self._client.stream(method, url, headers=headers, **kwargs) as response:
+                if response.status_code >= 400:
+                    response.read()
+                    processing_response(response, self._codec)
+                for chunk in response.iter_bytes():
+                    yield from parser.feed(chunk)
+                yield from parser.feed(b"", final=True)
+        except Exception as exc:
+            self._after_attempt(breaker, route, exc)
+            raise
+        except GeneratorExit:
+            # The consumer stopped early; the server had already answered successfully
+            self._after_attempt(breaker, route)
+            raise
+        except BaseException:
+            self._release_attempt(breaker)
+            raise
+        self._after_attempt(breaker, route)
 
 
 class AsyncBaseClient(BaseClient):
-    def __init__(self, base_url: str, apikey: str):
-        super().__init__(base_url, apikey)
-        self._client = httpx.AsyncClient(headers=self._headers, follow_redirects=True)
+    def _create_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            headers=self._headers,
+            follow_redirects=True,
+            **self._transport.client_kwargs(),
+        )
+
+    def _create_single_flight(self) -> AsyncSingleFlight:
+        return AsyncSingleFlight()
+
+    async def request(
+            self,
+            method: str,
+            endpoint: str,
+            idempotency_key: str = None,
+            route: str = None,
+            **kwargs,
+    ) -> Optional[dict]:
+        url = f"{self._base_url}{endpoint}"
+        extra_headers = kwargs.pop("headers", {})
+        headers = self._build_headers(extra_headers, idempotency_key)
+        self._encode_body(kwargs)
+        route = route if route else endpoint
+        key = None
+        if self._single_flight is not None:
+            key = self._single_flight_key(method, url, extra_headers, kwargs)
+        if key is not None:
+            return await self._single_flight.do(
+                key, lambda: self._send(method, url, headers, idempotency_key, route, kwargs),
+            )
+        return await self._send(method, url, headers, idempotency_key, route, kwargs)
+
+    async def conditional_request(
+            self,
+            method: str,
+            endpoint: str,
+            etag: str = None,
+            last_modified: str = None,
+            route: str = None,
+            **kwargs,
+    ) -> ConditionalResponse:
+        url = f"{self._base_url}{endpoint}"
+        headers = self._build_headers(build_conditional_headers(etag, last_modified), None)
+        self._encode_body(kwargs)
+        route = route if route else endpoint
+        return await self._send(method, url, headers, None, route, kwargs, processing_conditional_response)
+
+    async def _send(
+            self,
+            method: str,
+            url: str,
+            headers: dict,
+            idempotency_key: Optional[str],
+            route: str,
+            kwargs: dict,
+            handler: Callable[[httpx.Response, JsonCodec], Any] = processing_response,
+    ) -> Any:
+        breaker = self._get_breaker(method, route)
+        self._retry.record_request()
+        attempt = 1
+        while True:
+            delay = self._before_attempt(breaker, route)
+            try:
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                response = await self._client.request(method, url, headers=headers, **kwargs)
+                result = handler(response, self._codec)
+            except Exception as exc:
+                self._after_attempt(breaker, route, exc)
+                if self._is_landed_write(exc, attempt, idempotency_key):
+                    return None
+                if not self._retry.should_retry(method, attempt, exc, idempotency_key is not None):
+                    raise
+                delay = self._retry.backoff(attempt, exc)
+            except BaseException:
+                self._release_attempt(breaker)
+                raise
+            else:
+                self._after_attempt(breaker, route)
+                return result
+            await asyncio.sleep(delay)
+            attempt += 1
 
-    async def request(self, method: str, endpoint: str, **kwargs) -> Optional[dict]:
+    async def stream(self, method: str, endpoint: str, route: str = None, **kwargs) -> AsyncIterator[Any]:
         url = f"{self._base_url}{endpoint}"
-        headers = {**self._headers, **kwargs.pop("headers", {})}
-        response = await self._client.request(method, url, headers=headers, **kwargs)
-        return processing_response(response)
+        headers = self._build_headers(kwargs.pop("headers", {}), None)
+        self._encode_body(kwargs)
+        route = route if route else endpoint
+        breaker = self._get_breaker(method, route)
+        delay = self._before_attempt(breaker, route)
+        parser = JsonArrayParser()
+        try:
+            if delay > 0:
+                await asyncio.sleep(delay)
+            async with self._client.stream(method, url, headers=headers, **kwargs) as response:
+                if response.status_code >= 400:
+                    await response.aread()
+                    processing_response(response, self._codec)
+                async for chunk in response.aiter_bytes():
+                    for item in parser.feed(chunk):
+                        yield item
+                for item in parser.feed(b"", final=True):
+                    yield item
+        except Exception as exc:
+            self._after_attempt(breaker, route, exc)
+            raise
+        except GeneratorExit:
+            # The consumer stopped early; the server had already answered successfully
+            self._after_attempt(breaker, route)
+            raise
+        except BaseException:
+            self._release_attempt(breaker)
+            raise
+        self._after_attempt(breaker, route)
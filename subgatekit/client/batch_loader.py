@@ -0,0 +1,64 @@
+import asyncio
+from copy import deepcopy
+from typing import Awaitable, Callable, Hashable, Optional
+
+
+class AsyncBatchLoader[K: Hashable, V]:
+    def __init__(
+            self,
+            batch_fn: Callable[[list[K]], Awaitable[dict[K, V]]],
+            not_found: Callable[[K], Exception],
+            window: float = 0,
+            max_batch_size: int = 100,
+    ):
+        self._batch_fn = batch_fn
+        self._not_found = not_found
+        self._window = window
+        self._max_batch_size = max_batch_size
+        self._pending: dict[K, list[asyncio.Future]] = {}
+        self._handle: Optional[asyncio.Handle] = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def load(self, key: K) -> V:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault(key, []).append(future)
+        if len(self._pending) >= self._max_batch_size:
+            self._dispatch()
+        elif self._handle is None:
+            if self._window > 0:
+                self._handle = loop.call_later(self._window, self._dispatch)
+            else:
+                self._handle = loop.call_soon(self._dispatch)
+        return await future
+
+    def _dispatch(self) -> None:
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: dict[K, list[asyncio.Future]]) -> None:
+        try:
+            result = await self._batch_fn(list(batch))
+        except Exception as exc:
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(exc)
+            return
+
+        for key, futures in batch.items():
+            value = result.get(key)
+            for i, future in enumerate(futures):
+                if future.done():
+                    continue
+                if value is None:
+                    future.set_exception(self._not_found(key))
+                else:
+                    # Callers asking for the same key must not share one mutable object
+                    future.set_result(value if i == 0 else deepcopy(value))
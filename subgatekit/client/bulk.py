@@ -0,0 +1,85 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Awaitable, Iterable, Iterator, Optional, Any
+
+from subgatekit.exceptions import MultipleError
+from subgatekit.utils import ID
+
+BULK_MAX_CONCURRENCY = 8
+
+
+class BulkItemResult:
+    def __init__(self, item_id: ID, error: Optional[Exception] = None):
+        self.item_id = item_id
+        self.error = error
+
+    @property
+    def success(self) -> bool:
+        return self.error is None
+
+    def __repr__(self):
+        return f"BulkItemResult(item_id={self.item_id!r}, error={self.error!r})"
+
+
+class BulkResult:
+    def __init__(self, items: list[BulkItemResult]):
+        self.items = items
+
+    @property
+    def succeeded(self) -> list[BulkItemResult]:
+        return [x for x in self.items if x.success]
+
+    @property
+    def failed(self) -> list[BulkItemResult]:
+        return [x for x in self.items if not x.success]
+
+    def raise_for_errors(self) -> None:
+        errors = [x.error for x in self.items if x.error is not None]
+        if errors:
+            raise MultipleError(errors)
+
+    def __iter__(self) -> Iterator[BulkItemResult]:
+        return iter(self.items)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __repr__(self):
+        return f"BulkResult(succeeded={len(self.succeeded)}, failed={len(self.failed)})"
+
+
+def sync_run_bulk(
+        fn: Callable[[Any], None],
+        items: Iterable[Any],
+        max_concurrency: int = BULK_MAX_CONCURRENCY,
+) -> BulkResult:
+    def run(item: Any) -> BulkItemResult:
+        try:
+            fn(item)
+            return BulkItemResult(item.id)
+        except Exception as exc:
+            return BulkItemResult(item.id, exc)
+
+    # The pool is a sliding window: a worker picks up the next item as soon as its current one is done
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        return BulkResult(list(executor.map(run, items)))
+
+
+async def async_run_bulk(
+        fn: Callable[[Any], Awaitable[None]],
+        items: Iterable[Any],
+        max_concurrency: int = BULK_MAX_CONCURRENCY,
+) -> BulkResult:
+    iterator = enumerate(items)
+    results: dict[int, BulkItemResult] = {}
+
+    async def worker() -> None:
+        for index, item in iterator:
+            try:
+                await fn(item)
+                results[index] = BulkItemResult(item.id)
+            except Exception as exc:
+                results[index] = BulkItemResult(item.id, exc)
+
+    await asyncio.gather(*(worker() for _ in range(max_concurrency)))
+    return BulkResult([results[x] for x in range(len(results))])
@@ -0,0 +1,255 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Hashable, Any, Self, Awaitable
+
+from subgatekit.client.retry import is_transient_error
+
+logger = logging.getLogger(__name__)
+
+MISSING: Any = object()
+
+
+class CachePolicy:
+    def __init__(
+            self,
+            max_size: int = 1024,
+            ttl: float = 60.0,
+            revalidate: bool = False,
+            stale_while_revalidate: float = 0.0,
+            stale_if_error: float = 0.0,
+            negative_ttl: float = 5.0,
+    ):
+        if max_size < 1:
+            raise ValueError("max_size must be greater than or equal to 1")
+        self.max_size = max_size
+        self.ttl = ttl
+        self.revalidate = revalidate
+        self.stale_while_revalidate = stale_while_revalidate
+        self.stale_if_error = stale_if_error
+        self.negative_ttl = negative_ttl
+
+    @property
+    def max_stale(self) -> float:
+        return max(self.stale_while_revalidate, self.stale_if_error)
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __repr__(self):
+        return f"CacheStats(hits={self.hits}, misses={self.misses}, evictions={self.evictions}, stale={self.stale})"
+
+
+class TTLCache[K: Hashable, V]:
+    def __init__(self, max_size: int = 1024, ttl: float = 60.0, max_stale: float = 0.0):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._max_stale = max_stale
+        self._items: OrderedDict[K, tuple[V, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = CacheStats()
+        self._loads: dict[K, set[object]] = {}
+
+    @classmethod
+    def from_policy(cls, policy: CachePolicy) -> Self:
+        return cls(policy.max_size, policy.ttl, policy.max_stale)
+
+    @property
+    def stats(self) -> CacheStats:
+        return self._stats
+
+    def get(self, key: K) -> V:
+        value, staleness = self.lookup(key)
+        if value is not MISSING and staleness >= 0:
+            self._stats.misses += 1
+            return MISSING
+        return value
+
+    def lookup(self, key: K) -> tuple[V, float]:
+        # Staleness is the number of seconds past expiry, negative while the entry is fresh
+        with self._lock:
+            item = self._items.get(key)
+            staleness = time.monotonic() - item[1] if item is not None else 0.0
+            if item is None or staleness > self._max_stale:
+                if item is not None:
+                    del self._items[key]
+                self._stats.misses += 1
+                return MISSING, 0.0
+            self._items.move_to_end(key)
+            if staleness < 0:
+                self._stats.hits += 1
+            return item[0], staleness
+
+    def set(self, key: K, value: V, ttl: float = None) -> None:
+        with self._lock:
+            self._set(key, value, ttl)
+
+    def _set(self, key: K, value: V, ttl: float = None) -> None:
+        self._items[key] = (value, time.monotonic() + (ttl if ttl is not None else self._ttl))
+        self._items.move_to_end(key)
+        while len(self._items) > self._max_size:
+            self._items.popitem(last=False)
+            self._stats.evictions += 1
+
+    def begin_load(self, key: K) -> object:
+        token = object()
+        with self._lock:
+            self._loads.setdefault(key, set()).add(token)
+        return token
+
+    def end_load(self, key: K, token: object) -> None:
+        with self._lock:
+            self._discard_load(key, token)
+
+    def set_loaded(self, key: K, value: V, token: object, ttl: float = None) -> None:
+        # A load that raced with an invalidation of its key must not put the outdated value back
+        with self._lock:
+            if token in self._loads.get(key, ()):
+                self._discard_load(key, token)
+                self._set(key, value, ttl)
+
+    def _discard_load(self, key: K, token: object) -> None:
+        tokens = self._loads.get(key)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._loads[key]
+
+    def delete(self, key: K) -> None:
+        with self._lock:
+            self._items.pop(key, None)
+            self._loads.pop(key, None)
+
+    def delete_where(self, predicate: Callable[[V], bool]) -> None:
+        with self._lock:
+            for key in [k for k, (value, _) in self._items.items() if predicate(value)]:
+                del self._items[key]
+                self._loads.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._loads.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class _LoadingCache[K: Hashable, V](TTLCache[K, V]):
+    def __init__(self, policy: CachePolicy):
+        super().__init__(policy.max_size, policy.ttl, policy.max_stale)
+        self._policy = policy
+        self._refreshing: set[K] = set()
+
+    def _claim_refresh(self, key: K) -> bool:
+        # Many callers may hit the same stale entry, only the first one starts a refresh
+        with self._lock:
+            self._stats.stale += 1
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def _can_serve_stale(self, key: K, staleness: float, exc: Exception) -> bool:
+        if staleness > self._policy.stale_if_error or not is_transient_error(exc):
+            return False
+        logger.warning(f"Serving a stale cache entry for '{key}' ({staleness:.1f}s past expiry): {exc!r}")
+        self._stats.stale += 1
+        return True
+
+    def _store(self, key: K, value: V, token: object) -> None:
+        # Negative results are kept briefly, so a subscription created elsewhere shows up soon
+        self.set_loaded(key, value, token, self._policy.negative_ttl if value is None else None)
+
+    def _finish_refresh(self, key: K) -> None:
+        with self._lock:
+            self._refreshing.discard(key)
+
+
+class SyncLoadingCache[K: Hashable, V](_LoadingCache[K, V]):
+    def __init__(self, policy: CachePolicy):
+        super().__init__(policy)
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="subgate-cache-refresh")
+
+    def get_or_load(self, key: K, load: Callable[[], V]) -> V:
+        value, staleness = self.lookup(key)
+        if value is not MISSING:
+            if staleness < 0:
+                return value
+            if staleness <= self._policy.stale_while_revalidate:
+                if self._claim_refresh(key):
+                    self._executor.submit(self._refresh, key, load, self.begin_load(key))
+                return value
+            self._stats.misses += 1
+        token = self.begin_load(key)
+        try:
+            result = load()
+            self._store(key, result, token)
+        except Exception as exc:
+            if value is not MISSING and self._can_serve_stale(key, staleness, exc):
+                return value
+            raise
+        finally:
+            self.end_load(key, token)
+        return result
+
+    def _refresh(self, key: K, load: Callable[[], V], token: object) -> None:
+        try:
+            self._store(key, load(), token)
+        except Exception as exc:
+            logger.warning(f"Refreshing the cache entry for '{key}' failed: {exc!r}")
+        finally:
+            self.end_load(key, token)
+            self._finish_refresh(key)
+
+
+class AsyncLoadingCache[K: Hashable, V](_LoadingCache[K, V]):
+    def __init__(self, policy: CachePolicy):
+        super().__init__(policy)
+        self._tasks: set[asyncio.Task] = set()
+
+    async def get_or_load(self, key: K, load: Callable[[], Awaitable[V]]) -> V:
+        value, staleness = self.lookup(key)
+        if value is not MISSING:
+            if staleness < 0:
+                return value
+            if staleness <= self._policy.stale_while_revalidate:
+                if self._claim_refresh(key):
+                    task = asyncio.get_running_loop().create_task(self._refresh(key, load, self.begin_load(key)))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+                return value
+            self._stats.misses += 1
+        token = self.begin_load(key)
+        try:
+            result = await load()
+            self._store(key, result, token)
+        except Exception as exc:
+            if value is not MISSING and self._can_serve_stale(key, staleness, exc):
+                return value
+            raise
+        finally:
+            self.end_load(key, token)
+        return result
+
+    async def _refresh(self, key: K, load: Callable[[], Awaitable[V]], token: object) -> None:
+        try:
+            self._store(key, await load(), token)
+        except Exception as exc:
+            logger.warning(f"Refreshing the cache entry for '{key}' failed: {exc!r}")
+        finally:
+            self.end_load(key, token)
+            self._finish_refresh(key)
@@ -0,0 +1,80 @@
+import hashlib
+import json
+import threading
+from copy import deepcopy
+from typing import Any, Optional
+
+MERGE_PATCH_HEADERS = {"Content-Type": "application/merge-patch+json"}
+_SNAPSHOT_ATTR = "_snapshot"
+_FINGERPRINT_ATTR = "_fingerprint"
+_MISSING = object()
+
+
+def take_snapshot(entity: Any, data: dict) -> None:
+    # The serialized document shares the 'fields' dict with the entity, so it has to be detached
+    snapshot = {**data, "fields": deepcopy(data["fields"])}
+    object.__setattr__(entity, _SNAPSHOT_ATTR, snapshot)
+
+
+def get_snapshot(entity: Any) -> Optional[dict]:
+    return getattr(entity, _SNAPSHOT_ATTR, None)
+
+
+def _diff(original: dict, current: dict) -> dict:
+    # RFC 7386: objects are merged key by key, anything else (usages, discounts, usage_rates) is replaced whole
+    patch = {}
+    for key, value in current.items():
+        old = original.get(key, _MISSING)
+        if isinstance(value, dict) and isinstance(old, dict):
+            nested = _diff(old, value)
+            if nested:
+                patch[key] = nested
+        elif old is _MISSING or old != value:
+            patch[key] = value
+    for key in original.keys() - current.keys():
+        patch[key] = None
+    return patch
+
+
+def build_change_set(original: dict, current: dict) -> dict:
+    return _diff(original, current)
+
+
+def build_fingerprint(data: dict) -> bytes:
+    content = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")
+    return hashlib.blake2b(content, digest_size=16).digest()
+
+
+def take_fingerprint(entity: Any, data: dict) -> None:
+    object.__setattr__(entity, _FINGERPRINT_ATTR, build_fingerprint(data))
+
+
+def is_unchanged(entity: Any, data: dict) -> bool:
+    fingerprint = getattr(entity, _FINGERPRINT_ATTR, None)
+    return fingerprint is not None and fingerprint == build_fingerprint(data)
+
+
+class UpdateStats:
+    def __init__(self):
+        self._sent = 0
+        self._skipped = 0
+        self._lock = threading.Lock()
+
+    @property
+    def sent(self) -> int:
+        return self._sent
+
+    @property
+    def skipped(self) -> int:
+        return self._skipped
+
+    def record_sent(self) -> None:
+        with self._lock:
+            self._sent += 1
+
+    def record_skipped(self) -> None:
+        with self._lock:
+            self._skipped += 1
+
+    def __repr__(self):
+        return f"UpdateStats(sent={self._sent}, skipped={self._skipped})"
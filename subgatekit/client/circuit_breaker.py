@@ -0,0 +1,120 @@
+import threading
+import time
+from enum import StrEnum
+
+import httpx
+
+from subgatekit.exceptions import CircuitOpenError
+
+
+class CircuitState(StrEnum):
+    Closed = "closed"
+    Open = "open"
+    HalfOpen = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(
+            self,
+            key: str,
+            failure_threshold: int = 5,
+            recovery_timeout: float = 30.0,
+            half_open_max_calls: int = 1,
+    ):
+        self.key = key
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._state = CircuitState.Closed
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> CircuitState:
+        with self._lock:
+            if self._state == CircuitState.Open and self._remaining() <= 0:
+                return CircuitState.HalfOpen
+            return self._state
+
+    def _remaining(self) -> float:
+        return self._opened_at + self.recovery_timeout - time.monotonic()
+
+    def before_request(self) -> None:
+        with self._lock:
+            if self._state == CircuitState.Open:
+                remaining = self._remaining()
+                if remaining > 0:
+                    raise CircuitOpenError(self.key, remaining)
+                self._state = CircuitState.HalfOpen
+                self._probes = 0
+            if self._state == CircuitState.HalfOpen:
+                if self._probes >= self.half_open_max_calls:
+                    raise CircuitOpenError(self.key, 0)
+                self._probes += 1
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = CircuitState.Closed
+            self._failures = 0
+            self._probes = 0
+
+    def release(self) -> None:
+        # A probe that never got an answer (e.g. a cancelled request) gives its slot back without deciding anything
+        with self._lock:
+            if self._state == CircuitState.HalfOpen and self._probes > 0:
+                self._probes -= 1
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == CircuitState.HalfOpen or self._failures >= self.failure_threshold:
+                self._state = CircuitState.Open
+                self._opened_at = time.monotonic()
+                self._probes = 0
+
+    @staticmethod
+    def is_failure(exc: Exception) -> bool:
+        if isinstance(exc, httpx.TransportError):
+            return True
+        if isinstance(exc, httpx.HTTPStatusError):
+            return exc.response.status_code >= 500
+        return False
+
+
+class CircuitBreakerPolicy:
+    def __init__(
+            self,
+            failure_threshold: int = 5,
+            recovery_timeout: float = 30.0,
+            half_open_max_calls: int = 1,
+    ):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def build_key(method: str, route: str) -> str:
+        return f"{method.upper()} {route}"
+
+    def get(self, method: str, route: str) -> CircuitBreaker:
+        key = self.build_key(method, route)
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(key)
+                if breaker is None:
+                    breaker = CircuitBreaker(key, self.failure_threshold, self.recovery_timeout,
+                                             self.half_open_max_calls)
+                    self._breakers[key] = breaker
+        return breaker
+
+    def state(self, method: str, route: str) -> CircuitState:
+        breaker = self._breakers.get(self.build_key(method, route))
+        return breaker.state if breaker else CircuitState.Closed
+
+    def states(self) -> dict[str, CircuitState]:
+        return {key: breaker.state for key, breaker in list(self._breakers.items())}
@@ -1,6 +1,13 @@
 from subgatekit.client.base_client import SyncBaseClient, AsyncBaseClient
+from subgatekit.client.cache import CachePolicy
+from subgatekit.client.circuit_breaker import CircuitBreakerPolicy
+from subgatekit.client.codecs import JsonCodec
 from subgatekit.client.plan_client import SyncPlanClient, AsyncPlanClient
+from subgatekit.client.rate_limiter import RateLimit
+from subgatekit.client.retry import RetryPolicy
+from subgatekit.client.spool import SyncWriteSpool, AsyncWriteSpool
 from subgatekit.client.subscription_client import SyncSubscriptionClient, AsyncSubscriptionClient
+from subgatekit.client.transport import TransportConfig
 from subgatekit.client.webhook_client import SyncWebhookClient, AsyncWebhookClient
 
 
@@ -9,12 +16,30 @@ class SubgateClient:
             self,
             base_url: str,
             apikey_public_id: str,
-            apikey_secret: str
+            apikey_secret: str,
+            transport: TransportConfig = None,
+            retry: RetryPolicy = None,
+            circuit_breaker: CircuitBreakerPolicy = None,
+            rate_limit: RateLimit = None,
+            single_flight: bool = False,
+            codec: JsonCodec = None,
+            partial_updates: bool = False,
+            skip_unchanged: bool = False,
+            cache: CachePolicy = None,
     ):
-        base_client = SyncBaseClient(base_url, f"{apikey_public_id}:{apikey_secret}")
-        self._plan_client = SyncPlanClient(base_client)
-        self._sub_client = SyncSubscriptionClient(base_client)
-        self._webhook_client = SyncWebhookClient(base_client)
+        self._base_client = SyncBaseClient(
+            base_url,
+            f"{apikey_public_id}:{apikey_secret}",
+            transport=transport,
+            retry=retry,
+            circuit_breaker=circuit_breaker,
+            rate_limit=rate_limit,
+            single_flight=single_flight,
+            codec=codec,
+        )
+        self._plan_client = SyncPlanClient(self._base_client, partial_updates, skip_unchanged, cache)
+        self._sub_client = SyncSubscriptionClient(self._base_client, partial_updates, skip_unchanged, cache)
+        self._webhook_client = SyncWebhookClient(self._base_client)
 
     def plan_client(self) -> SyncPlanClient:
         return self._plan_client
@@ -25,13 +50,42 @@ class SubgateClient:
     def webhook_client(self) -> SyncWebhookClient:
         return self._webhook_client
 
+    def write_spool(self, path: str, **kwargs) -> SyncWriteSpool:
+        return SyncWriteSpool(self._base_client, path, **kwargs)
+
 
 class AsyncSubgateClient:
-    def __init__(self, base_url: str, apikey_public_id: str, apikey_secret: str):
-        base_client = AsyncBaseClient(base_url, f"{apikey_public_id}:{apikey_secret}")
-        self._plan_client = AsyncPlanClient(base_client)
-        self._sub_client = AsyncSubscriptionClient(base_client)
-        self._webhook_client = AsyncWebhookClient(base_client)
+    def __init__(
+            self,
+            base_url: str,
+            apikey_public_id: str,
+            apikey_secret: str,
+            transport: TransportConfig = None,
+            retry: RetryPolicy = None,
+            circuit_breaker: CircuitBreakerPolicy = None,
+            rate_limit: RateLimit = None,
+            single_flight: bool = False,
+            codec: JsonCodec = None,
+            batch_window: float = None,
+            partial_updates: bool = False,
+            skip_unchanged: bool = False,
+            cache: CachePolicy = None,
+    ):
+        self._base_client = AsyncBaseClient(
+            base_url,
+            f"{apikey_public_id}:{apikey_secret}",
+            transport=transport,
+            retry=retry,
+            circuit_breaker=circuit_breaker,
+            rate_limit=rate_limit,
+            single_flight=single_flight,
+            codec=codec,
+        )
+        self._plan_client = AsyncPlanClient(self._base_client, batch_window, partial_updates, skip_unchanged, cache)
+        self._sub_client = AsyncSubscriptionClient(
+            self._base_client, batch_window, partial_updates, skip_unchanged, cache,
+        )
+        self._webhook_client = AsyncWebhookClient(self._base_client)
 
     def plan_client(self) -> AsyncPlanClient:
         return self._plan_client
@@ -41,3 +95,6 @@ class AsyncSubgateClient:
 
     def webhook_client(self) -> AsyncWebhookClient:
         return self._webhook_client
+
+    def write_spool(self, path: str, **kwargs) -> AsyncWriteSpool:
+        return AsyncWriteSpool(self._base_client, path, **kwargs)
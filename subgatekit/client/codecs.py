@@ -0,0 +1,52 @@
+import json
+from abc import ABC, abstractmethod
+from typing import Any
+
+
+class JsonCodec(ABC):
+    @abstractmethod
+    def encode(self, data: Any) -> bytes:
+        raise NotImplementedError
+
+    @abstractmethod
+    def decode(self, content: bytes) -> Any:
+        raise NotImplementedError
+
+
+class StdlibJsonCodec(JsonCodec):
+    def encode(self, data: Any) -> bytes:
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def decode(self, content: bytes) -> Any:
+        return json.loads(content)
+
+
+class OrjsonCodec(JsonCodec):
+    def __init__(self):
+        try:
+            import orjson
+        except ImportError as exc:
+            raise ImportError("OrjsonCodec requires the 'orjson' package: pip install orjson") from exc
+        self._orjson = orjson
+
+    def encode(self, data: Any) -> bytes:
+        return self._orjson.dumps(data)
+
+    def decode(self, content: bytes) -> Any:
+        return self._orjson.loads(content)
+
+
+class MsgspecCodec(JsonCodec):
+    def __init__(self):
+        try:
+            import msgspec
+        except ImportError as exc:
+            raise ImportError("MsgspecCodec requires the 'msgspec' package: pip install msgspec") from exc
+        self._encoder = msgspec.json.Encoder()
+        self._decoder = msgspec.json.Decoder()
+
+    def encode(self, data: Any) -> bytes:
+        return self._encoder.encode(data)
+
+    def decode(self, content: bytes) -> Any:
+        return self._decoder.decode(content)
@@ -1,9 +1,12 @@
 from datetime import datetime
+from typing import Any, Callable, Optional
 
-from subgatekit.entities import Plan, UsageRate, Usage, Discount, PlanInfo, BillingInfo, Subscription, Webhook
+from subgatekit.entities import (Plan, UsageRate, Usage, Discount, PlanInfo, BillingInfo, Subscription, Webhook,
+                                 PartialSubscription, PartialPlan)
 from subgatekit.enums import Period, SubscriptionStatus, EventCode
 from subgatekit.factories import (create_plan_with_internal_fields, create_subscription_with_internal_fields,
                                   create_webhook_with_internal_fields)
+from subgatekit.item_manager import ItemManager
 from subgatekit.utils import ID
 
 
@@ -127,3 +130,49 @@ def deserialize_webhook(data: dict) -> Webhook:
         created_at=created_at,
         updated_at=updated_at,
     )
+
+
+def _deserialize_datetime(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+def _items_deserializer(deserializer: Callable[[dict], Any]) -> Callable[[list[dict]], ItemManager]:
+    return lambda values: ItemManager(lambda x: x.code, [deserializer(x) for x in values])
+
+
+_partial_subscription_fields = {
+    "billing_info": deserialize_billing_info,
+    "plan_info": deserialize_plan_info,
+    "status": SubscriptionStatus,
+    "paused_from": _deserialize_datetime,
+    "usages": _items_deserializer(deserialize_usage),
+    "discounts": _items_deserializer(deserialize_discount),
+    "created_at": _deserialize_datetime,
+    "updated_at": _deserialize_datetime,
+}
+
+_partial_plan_fields = {
+    "billing_cycle": Period,
+    "usage_rates": _items_deserializer(deserialize_usage_rate),
+    "discounts": _items_deserializer(deserialize_discount),
+    "created_at": _deserialize_datetime,
+    "updated_at": _deserialize_datetime,
+}
+
+
+def _deserialize_partial_fields(data: dict, deserializers: dict[str, Callable[[Any], Any]]) -> dict:
+    result = {}
+    for key, value in data.items():
+        if key == "id":
+            continue
+        deserializer = deserializers.get(key)
+        result[key] = deserializer(value) if deserializer else value
+    return result
+
+
+def deserialize_partial_subscription(data: dict) -> PartialSubscription:
+    return PartialSubscription(ID(data["id"]), **_deserialize_partial_fields(data, _partial_subscription_fields))
+
+
+def deserialize_partial_plan(data: dict) -> PartialPlan:
+    return PartialPlan(ID(data["id"]), **_deserialize_partial_fields(data, _partial_plan_fields))
@@ -0,0 +1,24 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Awaitable
+
+MAX_CHUNK_CONCURRENCY = 8
+
+
+def sync_fan_out[T](fn: Callable[[dict], T], chunks: list[dict]) -> list[T]:
+    if len(chunks) == 1:
+        return [fn(chunks[0])]
+    with ThreadPoolExecutor(max_workers=min(len(chunks), MAX_CHUNK_CONCURRENCY)) as executor:
+        return list(executor.map(fn, chunks))
+
+
+async def async_fan_out[T](fn: Callable[[dict], Awaitable[T]], chunks: list[dict]) -> list[T]:
+    if len(chunks) == 1:
+        return [await fn(chunks[0])]
+    semaphore = asyncio.Semaphore(MAX_CHUNK_CONCURRENCY)
+
+    async def run(chunk: dict) -> T:
+        async with semaphore:
+            return await fn(chunk)
+
+    return list(await asyncio.gather(*(run(x) for x in chunks)))
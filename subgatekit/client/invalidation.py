@@ -0,0 +1,29 @@
+from typing import Union
+
+from subgatekit.client.client import SubgateClient, AsyncSubgateClient
+from subgatekit.enums import EventCode
+
+_SUBSCRIPTION_EVENTS = frozenset(x for x in EventCode if x.startswith("sub_"))
+_PLAN_EVENTS = frozenset(x for x in EventCode if x.startswith("plan_"))
+
+
+class CacheInvalidator:
+    def __init__(self, *clients: Union[SubgateClient, AsyncSubgateClient]):
+        self._sub_clients = [x.subscription_client() for x in clients]
+        self._plan_clients = [x.plan_client() for x in clients]
+
+    def handle(self, event: dict) -> bool:
+        try:
+            code = EventCode(event["event_code"])
+        except (KeyError, ValueError):
+            return False
+        payload = event.get("payload") or {}
+        if code in _SUBSCRIPTION_EVENTS:
+            for client in self._sub_clients:
+                client.invalidate(payload.get("id"), payload.get("subscriber_id"))
+            return True
+        if code in _PLAN_EVENTS:
+            for client in self._plan_clients:
+                client.invalidate(payload.get("id"))
+            return True
+        return False
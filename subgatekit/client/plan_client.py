@@ -1,33 +1,134 @@
-from typing import Union, Iterable
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union, Iterable, Iterator, AsyncIterator, Optional, Callable, Any
 from uuid import UUID
 
 from subgatekit.client.base_client import SyncBaseClient, AsyncBaseClient
-from subgatekit.client.deserializers import deserialize_plan
+from subgatekit.client.batch_loader import AsyncBatchLoader
+from subgatekit.client.bulk import BulkResult, sync_run_bulk, async_run_bulk, BULK_MAX_CONCURRENCY
+from subgatekit.client.cache import CachePolicy, TTLCache, MISSING
+from subgatekit.client.change_tracking import (take_snapshot, get_snapshot, build_change_set, take_fingerprint,
+                                                is_unchanged, UpdateStats, MERGE_PATCH_HEADERS)
+from subgatekit.client.deserializers import deserialize_plan, deserialize_partial_plan
+from subgatekit.client.fan_out import sync_fan_out, async_fan_out
+from subgatekit.client.revalidation import RevalidationCache, build_cache_key
 from subgatekit.client.serailizers import (
     serialize_plan,
 )
-from subgatekit.client.services import OrderBy, build_query_params
-from subgatekit.entities import Plan
+from subgatekit.client.services import (OrderBy, build_query_params, build_idempotency_key, build_keyset_order,
+                                         build_projection, next_page_position, parse_count,
+                                         split_query_params, merge_pages)
+from subgatekit.entities import Plan, PartialPlan
+from subgatekit.exceptions import ItemNotExist
 from subgatekit.utils import ID
 
 
 class SyncPlanClient:
-    def __init__(self, base_client: SyncBaseClient):
+    def __init__(
+            self,
+            base_client: SyncBaseClient,
+            partial_updates: bool = False,
+            skip_unchanged: bool = False,
+            cache: CachePolicy = None,
+    ):
         self._base_client = base_client
+        self._partial_updates = partial_updates
+        self._skip_unchanged = skip_unchanged
+        self._update_stats = UpdateStats()
+        self._revalidation = None
+        if cache is not None and cache.revalidate:
+            self._revalidation = RevalidationCache(cache.max_size, cache.stale_if_error, base_client.codec)
+        self._missing = TTLCache(cache.max_size, cache.negative_ttl) if cache is not None else None
+
+    @property
+    def update_stats(self) -> UpdateStats:
+        return self._update_stats
+
+    def invalidate(self, plan_id: ID = None) -> None:
+        if self._missing is None:
+            return
+        if plan_id is None:
+            self._missing.clear()
+            if self._revalidation is not None:
+                self._revalidation.clear()
+            return
+        self._missing.delete(str(plan_id))
+        if self._revalidation is not None:
+            self._revalidation.evict(lambda x: x.get("id") == str(plan_id))
+
+    def _track(self, plan: Plan, data: dict) -> None:
+        if self._partial_updates:
+            take_snapshot(plan, data)
+        if self._skip_unchanged:
+            take_fingerprint(plan, data)
+
+    def _deserialize(self, data: dict) -> Plan:
+        plan = deserialize_plan(data)
+        if self._partial_updates or self._skip_unchanged:
+            self._track(plan, serialize_plan(plan))
+        return plan
+
+    def _get(self, url: str, route: Optional[str], params: Optional[dict], deserialize: Callable[[Any], Any]) -> Any:
+        if self._revalidation is None:
+            return deserialize(self._base_client.request("GET", url, route=route, params=params))
+        key = build_cache_key(url, params)
+        entry = self._revalidation.lookup(key)
+        validators = entry.validators() if entry is not None else {}
+        try:
+            response = self._base_client.conditional_request("GET", url, route=route, params=params, **validators)
+        except Exception as exc:
+            if not self._revalidation.can_serve_stale(key, entry, exc):
+                raise
+            return self._revalidation.load(entry, deserialize)
+        return self._revalidation.resolve(key, entry, response, deserialize)
 
     def create(self, plan: Plan) -> None:
         url = "/plan"
         data = serialize_plan(plan)
-        self._base_client.request("POST", url, json=data)
+        key = build_idempotency_key(plan.id)
+        self._base_client.request("POST", url, json=data, idempotency_key=key)
+        self._track(plan, data)
+        self.invalidate(plan.id)
 
     def update(self, plan: Plan) -> None:
         url = f"/plan/{plan.id}"
         data = serialize_plan(plan)
-        self._base_client.request("PUT", url, json=data)
+        key = build_idempotency_key(plan.id)
+        if self._skip_unchanged and is_unchanged(plan, data):
+            self._update_stats.record_skipped()
+            return
+        snapshot = get_snapshot(plan) if self._partial_updates else None
+        if snapshot is not None:
+            changes = build_change_set(snapshot, data)
+            if not changes:
+                self._update_stats.record_skipped()
+                return
+            self._base_client.request("PATCH", url, json=changes, idempotency_key=key, route="/plan/{id}",
+                                      headers=MERGE_PATCH_HEADERS)
+        else:
+            self._base_client.request("PUT", url, json=data, idempotency_key=key, route="/plan/{id}")
+        self._update_stats.record_sent()
+        self._track(plan, data)
+        self.invalidate(plan.id)
+
+    def create_many(
+            self,
+            plans: Iterable[Plan],
+            max_concurrency: int = BULK_MAX_CONCURRENCY,
+    ) -> BulkResult:
+        return sync_run_bulk(self.create, plans, max_concurrency)
+
+    def update_many(
+            self,
+            plans: Iterable[Plan],
+            max_concurrency: int = BULK_MAX_CONCURRENCY,
+    ) -> BulkResult:
+        return sync_run_bulk(self.update, plans, max_concurrency)
 
     def delete_by_id(self, plan_id: ID) -> None:
         url = f"/plan/{plan_id}"
-        self._base_client.request("DELETE", url)
+        self._base_client.request("DELETE", url, route="/plan/{id}")
+        self.invalidate(plan_id)
 
     def delete_selected(
             self,
@@ -35,12 +136,28 @@ class SyncPlanClient:
     ):
         url = f"/plan/"
         params = build_query_params(ids=ids)
-        self._base_client.request("DELETE", url, params=params)
+        chunks = split_query_params(params)
+        sync_fan_out(lambda x: self._base_client.request("DELETE", url, params=x), chunks)
+        self.invalidate()
+
+    def get_by_id(self, plan_id: ID, fields: Iterable[str] = None) -> Union[Plan, PartialPlan]:
+        missing = self._missing.get(str(plan_id)) if self._missing is not None else MISSING
+        if missing is not MISSING:
+            raise ItemNotExist(missing.item_type, missing.lookup_field_value, missing.lookup_field_key)
+        try:
+            return self._get_by_id(plan_id, fields)
+        except ItemNotExist as exc:
+            if self._missing is not None:
+                self._missing.set(str(plan_id), exc)
+            raise
 
-    def get_by_id(self, plan_id: ID) -> Plan:
+    def _get_by_id(self, plan_id: ID, fields: Iterable[str] = None) -> Union[Plan, PartialPlan]:
         url = f"/plan/{plan_id}"
-        json_data = self._base_client.request("GET", url)
-        return deserialize_plan(json_data)
+        if fields is not None:
+            params = {"fields": build_projection(fields)}
+            json_data = self._base_client.request("GET", url, route="/plan/{id}", params=params)
+            return deserialize_partial_plan(json_data)
+        return self._get(url, "/plan/{id}", None, self._deserialize)
 
     def get_selected(
             self,
@@ -48,30 +165,205 @@ class SyncPlanClient:
             order_by: OrderBy = None,
             skip=0,
             limit=100,
+            after: str = None,
+            fields: Iterable[str] = None,
     ):
+        url = "/plan"
+        if after is not None:
+            order_by = build_keyset_order(order_by)
+            skip = None
+        params = build_query_params(ids, skip=skip, limit=limit, order_by=order_by, after=after, fields=fields)
+        deserialize = deserialize_partial_plan if fields is not None else self._deserialize
+        chunks = split_query_params(params)
+        deserialize_page = lambda data: [deserialize(x) for x in data]
+        pages = sync_fan_out(lambda x: self._get(url, None, x, deserialize_page), chunks)
+        return pages[0] if len(chunks) == 1 else merge_pages(pages, params)
+
+    def count_selected(
+            self,
+            ids: Union[UUID, Iterable[UUID]] = None,
+    ) -> int:
+        url = "/plan/count"
+        params = build_query_params(ids)
+        chunks = split_query_params(params)
+        counts = sync_fan_out(lambda x: self._base_client.request("GET", url, params=x), chunks)
+        return sum(parse_count(x) for x in counts)
+
+    def exists(
+            self,
+            ids: Union[UUID, Iterable[UUID]] = None,
+    ) -> bool:
+        url = "/plan"
+        params = build_query_params(ids, limit=1, fields=["id"])
+        chunks = split_query_params(params)
+        pages = sync_fan_out(lambda x: self._base_client.request("GET", url, params=x), chunks)
+        return any(len(x) > 0 for x in pages)
+
+    def iter_selected(
+            self,
+            ids: Union[UUID, Iterable[UUID]] = None,
+            order_by: OrderBy = None,
+            page_size=100,
+            keyset=False,
+    ) -> Iterator[Plan]:
+        order_by = build_keyset_order(order_by) if keyset else order_by
+        position = {"skip": None if keyset else 0, "after": None}
+        executor = ThreadPoolExecutor(max_workers=1)
+        future = executor.submit(self.get_selected, ids, order_by, limit=page_size, **position)
+        try:
+            while future is not None:
+                page = future.result()
+                future = None
+                position = next_page_position(page, page_size, position, order_by, keyset)
+                if position is not None:
+                    future = executor.submit(self.get_selected, ids, order_by, limit=page_size, **position)
+                yield from page
+        finally:
+            # Closing the iterator early must not wait for the page that is being prefetched
+            if future is not None:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def stream_selected(
+            self,
+            ids: Union[UUID, Iterable[UUID]] = None,
+            order_by: OrderBy = None,
+            skip=0,
+            limit=100,
+    ) -> Iterator[Plan]:
         url = "/plan"
         params = build_query_params(ids, skip=skip, limit=limit, order_by=order_by)
-        json_data = self._base_client.request("GET", url, params=params)
-        return [deserialize_plan(x) for x in json_data]
+        for json_data in self._base_client.stream("GET", url, params=params):
+            yield self._deserialize(json_data)
 
 
 class AsyncPlanClient:
-    def __init__(self, base_client: AsyncBaseClient):
+    def __init__(
+            self,
+            base_client: AsyncBaseClient,
+            batch_window: float = None,
+            partial_updates: bool = False,
+            skip_unchanged: bool = False,
+            cache: CachePolicy = None,
+    ):
         self._base_client = base_client
+        self._partial_updates = partial_updates
+        self._skip_unchanged = skip_unchanged
+        self._update_stats = UpdateStats()
+        self._revalidation = None
+        if cache is not None and cache.revalidate:
+            self._revalidation = RevalidationCache(cache.max_size, cache.stale_if_error, base_client.codec)
+        self._missing = TTLCache(cache.max_size, cache.negative_ttl) if cache is not None else None
+        self._loader = None
+        if batch_window is not None:
+            self._loader = AsyncBatchLoader(
+                self._get_json_by_ids,
+                lambda plan_id: ItemNotExist("Plan", plan_id, "id"),
+                window=batch_window,
+            )
+
+    @property
+    def update_stats(self) -> UpdateStats:
+        return self._update_stats
+
+    def invalidate(self, plan_id: ID = None) -> None:
+        if self._missing is None:
+            return
+        if plan_id is None:
+            self._missing.clear()
+            if self._revalidation is not None:
+                self._revalidation.clear()
+            return
+        self._missing.delete(str(plan_id))
+        if self._revalidation is not None:
+            self._revalidation.evict(lambda x: x.get("id") == str(plan_id))
+
+    def _track(self, plan: Plan, data: dict) -> None:
+        if self._partial_updates:
+            take_snapshot(plan, data)
+        if self._skip_unchanged:
+            take_fingerprint(plan, data)
+
+    def _deserialize(self, data: dict) -> Plan:
+        plan = deserialize_plan(data)
+        if self._partial_updates or self._skip_unchanged:
+            self._track(plan, serialize_plan(plan))
+        return plan
+
+    async def _get_json_by_ids(self, plan_ids: list[str]) -> dict[str, dict]:
+        params = build_query_params(ids=plan_ids, limit=len(plan_ids))
+        chunks = split_query_params(params)
+        pages = await async_fan_out(lambda x: self._base_client.request("GET", "/plan", params=x), chunks)
+        return {x["id"]: x for page in pages for x in page}
+
+    async def _get(
+            self,
+            url: str,
+            route: Optional[str],
+            params: Optional[dict],
+            deserialize: Callable[[Any], Any],
+    ) -> Any:
+        if self._revalidation is None:
+            return deserialize(await self._base_client.request("GET", url, route=route, params=params))
+        key = build_cache_key(url, params)
+        entry = self._revalidation.lookup(key)
+        validators = entry.validators() if entry is not None else {}
+        try:
+            response = await self._base_client.conditional_request("GET", url, route=route, params=params,
+                                                                   **validators)
+        except Exception as exc:
+            if not self._revalidation.can_serve_stale(key, entry, exc):
+                raise
+            return self._revalidation.load(entry, deserialize)
+        return self._revalidation.resolve(key, entry, response, deserialize)
 
     async def create(self, plan: Plan) -> None:
         url = "/plan"
         data = serialize_plan(plan)
-        await self._base_client.request("POST", url, json=data)
+        key = build_idempotency_key(plan.id)
+        await self._base_client.request("POST", url, json=data, idempotency_key=key)
+        self._track(plan, data)
+        self.invalidate(plan.id)
 
     async def update(self, plan: Plan) -> None:
         url = f"/plan/{plan.id}"
         data = serialize_plan(plan)
-        await self._base_client.request("PUT", url, json=data)
+        key = build_idempotency_key(plan.id)
+        if self._skip_unchanged and is_unchanged(plan, data):
+            self._update_stats.record_skipped()
+            return
+        snapshot = get_snapshot(plan) if self._partial_updates else None
+        if snapshot is not None:
+            changes = build_change_set(snapshot, data)
+            if not changes:
+                self._update_stats.record_skipped()
+                return
+            await self._base_client.request("PATCH", url, json=changes, idempotency_key=key, route="/plan/{id}",
+                                            headers=MERGE_PATCH_HEADERS)
+        else:
+            await self._base_client.request("PUT", url, json=data, idempotency_key=key, route="/plan/{id}")
+        self._update_stats.record_sent()
+        self._track(plan, data)
+        self.invalidate(plan.id)
+
+    async def create_many(
+            self,
+            plans: Iterable[Plan],
+            max_concurrency: int = BULK_MAX_CONCURRENCY,
+    ) -> BulkResult:
+        return await async_run_bulk(self.create, plans, max_concurrency)
+
+    async def update_many(
+            self,
+            plans: Iterable[Plan],
+            max_concurrency: int = BULK_MAX_CONCURRENCY,
+    ) -> BulkResult:
+        return await async_run_bulk(self.update, plans, max_concurrency)
 
     async def delete_by_id(self, plan_id: ID) -> None:
         url = f"/plan/{plan_id}"
-        await self._base_client.request("DELETE", url)
+        await self._base_client.request("DELETE", url, route="/plan/{id}")
+        self.invalidate(plan_id)
 
     async def delete_selected(
             self,
@@ -79,12 +371,31 @@ class AsyncPlanClient:
     ):
         url = f"/plan/"
         params = build_query_params(ids=ids)
-        await self._base_client.request("DELETE", url, params=params)
+        chunks = split_query_params(params)
+        await async_fan_out(lambda x: self._base_client.request("DELETE", url, params=x), chunks)
+        self.invalidate()
 
-    async def get_by_id(self, plan_id: ID) -> Plan:
+    async def get_by_id(self, plan_id: ID, fields: Iterable[str] = None) -> Union[Plan, PartialPlan]:
+        missing = self._missing.get(str(plan_id)) if self._missing is not None else MISSING
+        if missing is not MISSING:
+            raise ItemNotExist(missing.item_type, missing.lookup_field_value, missing.lookup_field_key)
+        try:
+            return await self._get_by_id(plan_id, fields)
+        except ItemNotExist as exc:
+            if self._missing is not None:
+                self._missing.set(str(plan_id), exc)
+            raise
+
+    async def _get_by_id(self, plan_id: ID, fields: Iterable[str] = None) -> Union[Plan, PartialPlan]:
         url = f"/plan/{plan_id}"
-        json_data = await self._base_client.request("GET", url)
-        return deserialize_plan(json_data)
+        if fields is not None:
+            params = {"fields": build_projection(fields)}
+            json_data = await self._base_client.request("GET", url, route="/plan/{id}", params=params)
+            return deserialize_partial_plan(json_data)
+        if self._loader is not None:
+            json_data = await self._loader.load(str(plan_id))
+            return self._deserialize(json_data)
+        return await self._get(url, "/plan/{id}", None, self._deserialize)
 
     async def get_selected(
             self,
@@ -92,8 +403,71 @@ class AsyncPlanClient:
             order_by: OrderBy = None,
             skip=0,
             limit=100,
+            after: str = None,
+            fields: Iterable[str] = None,
     ):
+        url = "/plan"
+        if after is not None:
+            order_by = build_keyset_order(order_by)
+            skip = None
+        params = build_query_params(ids, skip=skip, limit=limit, order_by=order_by, after=after, fields=fields)
+        deserialize = deserialize_partial_plan if fields is not None else self._deserialize
+        chunks = split_query_params(params)
+        deserialize_page = lambda data: [deserialize(x) for x in data]
+        pages = await async_fan_out(lambda x: self._get(url, None, x, deserialize_page), chunks)
+        return pages[0] if len(chunks) == 1 else merge_pages(pages, params)
+
+    async def count_selected(
+            self,
+            ids: Union[UUID, Iterable[UUID]] = None,
+    ) -> int:
+        url = "/plan/count"
+        params = build_query_params(ids)
+        chunks = split_query_params(params)
+        counts = await async_fan_out(lambda x: self._base_client.request("GET", url, params=x), chunks)
+        return sum(parse_count(x) for x in counts)
+
+    async def exists(
+            self,
+            ids: Union[UUID, Iterable[UUID]] = None,
+    ) -> bool:
+        url = "/plan"
+        params = build_query_params(ids, limit=1, fields=["id"])
+        chunks = split_query_params(params)
+        pages = await async_fan_out(lambda x: self._base_client.request("GET", url, params=x), chunks)
+        return any(len(x) > 0 for x in pages)
+
+    async def aiter_selected(
+            self,
+            ids: Union[UUID, Iterable[UUID]] = None,
+            order_by: OrderBy = None,
+            page_size=100,
+            keyset=False,
+    ) -> AsyncIterator[Plan]:
+        order_by = build_keyset_order(order_by) if keyset else order_by
+        position = {"skip": None if keyset else 0, "after": None}
+        task = asyncio.ensure_future(self.get_selected(ids, order_by, limit=page_size, **position))
+        try:
+            while task is not None:
+                page = await task
+                task = None
+                position = next_page_position(page, page_size, position, order_by, keyset)
+                if position is not None:
+                    task = asyncio.ensure_future(self.get_selected(ids, order_by, limit=page_size, **position))
+                for plan in page:
+                    yield plan
+        finally:
+            if task is not None:
+                task.cancel()
+
+    async def astream_selected(
+            self,
+            ids: Union[UUID, Iterable[UUID]] = None,
+            order_by: OrderBy = None,
+            skip=0,
+            limit=100,
+    ) -> AsyncIterator[Plan]:
         url = "/plan"
         params = build_query_params(ids, skip=skip, limit=limit, order_by=order_by)
-        json_data = await self._base_client.request("GET", url, params=params)
-        return [deserialize_plan(x) for x in json_data]
+        async for json_data in self._base_client.stream("GET", url, params=params):
+            yield self._deserialize(json_data)
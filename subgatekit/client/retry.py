@@ -0,0 +1,123 @@
+import random
+import threading
+import time
+from typing import Iterable, Self
+
+import httpx
+
+from subgatekit.client.services import get_retry_after
+from subgatekit.exceptions import CircuitOpenError
+
+RETRYABLE_STATUS_CODES = frozenset({429, 502, 503, 504})
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+
+def is_throttled(exc: Exception) -> bool:
+    return isinstance(exc, httpx.HTTPStatusError) and exc.response.status_code == 429
+
+
+def is_transient_error(exc: Exception) -> bool:
+    if isinstance(exc, (httpx.TransportError, CircuitOpenError)):
+        return True
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code == 429 or exc.response.status_code >= 500
+    return False
+
+
+class RetryBudget:
+    def __init__(
+            self,
+            ratio: float = 0.2,
+            min_retries_per_second: float = 5.0,
+            max_tokens: float = 100.0,
+    ):
+        self.ratio = ratio
+        self.min_retries_per_second = min_retries_per_second
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, deposit: float) -> None:
+        now = time.monotonic()
+        elapsed = now - self._updated_at
+        self._updated_at = now
+        self._tokens = min(self.max_tokens, self._tokens + elapsed * self.min_retries_per_second + deposit)
+
+    def record_request(self) -> None:
+        with self._lock:
+            self._refill(self.ratio)
+
+    def try_withdraw(self) -> bool:
+        with self._lock:
+            self._refill(0)
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    @property
+    def available(self) -> float:
+        with self._lock:
+            self._refill(0)
+            return self._tokens
+
+
+class RetryPolicy:
+    def __init__(
+            self,
+            max_attempts: int = 3,
+            backoff_base: float = 0.1,
+            backoff_max: float = 2.0,
+            retry_after_max: float = 60.0,
+            jitter: bool = True,
+            retry_statuses: Iterable[int] = RETRYABLE_STATUS_CODES,
+            retry_methods: Iterable[str] = IDEMPOTENT_METHODS,
+            budget: RetryBudget = None,
+    ):
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be greater than or equal to 1")
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_after_max = retry_after_max
+        self.jitter = jitter
+        self.retry_statuses = frozenset(retry_statuses)
+        self.retry_methods = frozenset(x.upper() for x in retry_methods)
+        self.budget = budget if budget else RetryBudget()
+
+    @classmethod
+    def disabled(cls) -> Self:
+        return cls(max_attempts=1)
+
+    def is_retryable_error(self, exc: Exception) -> bool:
+        if isinstance(exc, (httpx.ConnectError, httpx.TimeoutException)):
+            return True
+        if isinstance(exc, httpx.HTTPStatusError):
+            return exc.response.status_code in self.retry_statuses
+        # ItemNotExist, ItemAlreadyExist, ActiveStatusConflict, 422 and other 4xx are final
+        return False
+
+    def record_request(self) -> None:
+        if self.max_attempts > 1:
+            self.budget.record_request()
+
+    def should_retry(self, method: str, attempt: int, exc: Exception, idempotent: bool = False) -> bool:
+        if attempt >= self.max_attempts:
+            return False
+        # A throttled request has not been processed, so it is safe to resend whatever the method
+        if not idempotent and method.upper() not in self.retry_methods and not is_throttled(exc):
+            return False
+        if not self.is_retryable_error(exc):
+            return False
+        return self.budget.try_withdraw()
+
+    def backoff(self, attempt: int, exc: Exception = None) -> float:
+        if isinstance(exc, httpx.HTTPStatusError):
+            retry_after = get_retry_after(exc.response)
+            if retry_after is not None:
+                return min(self.retry_after_max, retry_after)
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        if self.jitter:
+            return random.uniform(0, delay)
+        return delay
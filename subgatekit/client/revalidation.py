@@ -0,0 +1,85 @@
+import logging
+import math
+import time
+from typing import Any, Callable, Optional
+
+import httpx
+
+from subgatekit.client.cache import TTLCache, MISSING
+from subgatekit.client.codecs import JsonCodec, StdlibJsonCodec
+from subgatekit.client.retry import is_transient_error
+from subgatekit.client.services import ConditionalResponse
+
+logger = logging.getLogger(__name__)
+
+
+class Revalidated:
+    def __init__(self, data: Any, content: bytes, etag: Optional[str], last_modified: Optional[str]):
+        self.data = data
+        self.content = content
+        self.etag = etag
+        self.last_modified = last_modified
+        self.validated_at = time.monotonic()
+
+    def validators(self) -> dict:
+        return {"etag": self.etag, "last_modified": self.last_modified}
+
+
+def build_cache_key(endpoint: str, params: dict = None) -> str:
+    return str(httpx.URL(endpoint, params=params)) if params else endpoint
+
+
+class RevalidationCache:
+    def __init__(self, max_size: int = 1024, stale_if_error: float = 0.0, codec: JsonCodec = None):
+        # Entries never expire: every read is revalidated against the server, so the size bound is the only limit
+        self._items: TTLCache[str, Revalidated] = TTLCache(max_size, math.inf)
+        self._stale_if_error = stale_if_error
+        self._codec = codec if codec else StdlibJsonCodec()
+
+    def lookup(self, key: str) -> Optional[Revalidated]:
+        entry = self._items.get(key)
+        return None if entry is MISSING else entry
+
+    def resolve(
+            self,
+            key: str,
+            entry: Optional[Revalidated],
+            response: ConditionalResponse,
+            deserialize: Callable[[Any], Any],
+    ) -> Any:
+        if response.not_modified and entry is not None:
+            entry.validated_at = time.monotonic()
+            return self.load(entry, deserialize)
+        if response.etag is None and response.last_modified is None:
+            self._items.delete(key)
+        else:
+            self._items.set(key, Revalidated(response.data, response.content, response.etag, response.last_modified))
+        return deserialize(response.data)
+
+    def load(self, entry: Revalidated, deserialize: Callable[[Any], Any]) -> Any:
+        # Every hit is built from the cached body, so callers never share a mutable plan or list with the cache
+        return deserialize(self._codec.decode(entry.content))
+
+    def can_serve_stale(self, key: str, entry: Optional[Revalidated], exc: Exception) -> bool:
+        if entry is None or not is_transient_error(exc):
+            return False
+        staleness = time.monotonic() - entry.validated_at
+        if staleness > self._stale_if_error:
+            return False
+        logger.warning(f"Serving '{key}' as validated {staleness:.1f}s ago: {exc!r}")
+        self._items.stats.stale += 1
+        return True
+
+    def evict(self, predicate: Callable[[dict], bool]) -> None:
+        # Drops every cached response holding a matching item, whether it was fetched alone or inside a list
+        def holds(entry: Revalidated) -> bool:
+            items = entry.data if isinstance(entry.data, list) else [entry.data]
+            return any(predicate(x) for x in items)
+
+        self._items.delete_where(holds)
+
+    def clear(self) -> None:
+        self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
@@ -1,29 +1,40 @@
+import base64
 import datetime
+import json
 import logging
-from typing import Optional, Iterable, Literal
+from email.utils import parsedate_to_datetime
+from enum import Enum
+from operator import attrgetter
+from typing import Optional, Iterable, Literal, Any, Union, Callable
+from urllib.parse import quote
+from uuid import uuid4, UUID
 
 import httpx
 
+from subgatekit.client.codecs import JsonCodec, StdlibJsonCodec
 from subgatekit.enums import SubscriptionStatus
 from subgatekit.exceptions import ItemNotExist, ItemAlreadyExist, ActiveStatusConflict
 from subgatekit.utils import ID
 
+_default_codec = StdlibJsonCodec()
 
-def processing_response(response: httpx.Response):
+
+def processing_response(response: httpx.Response, codec: JsonCodec = None):
+    codec = codec if codec else _default_codec
     if response.status_code == 404:
-        data = response.json()
+        data = codec.decode(response.content)
         if data.get("exception_code") == "item_not_exist":
             raise ItemNotExist.from_json(data)
         response.raise_for_status()
 
     if response.status_code == 409:
-        data = response.json()
+        data = codec.decode(response.content)
         if data["exception_code"] == "active_status_conflict":
             raise ActiveStatusConflict.from_json(data)
         raise ItemAlreadyExist.from_json(data)
 
     if response.status_code == 422:
-        logger.error(response.json())
+        logger.error(codec.decode(response.content))
         raise Exception("HttpStatusCode422")
 
     if response.status_code >= 400:
@@ -31,14 +42,69 @@ def processing_response(response: httpx.Response):
 
     if response.status_code == 204:
         return None
-    return response.json()
+    return codec.decode(response.content)
+
+
+class ConditionalResponse:
+    def __init__(
+            self,
+            data: Any,
+            etag: Optional[str],
+            last_modified: Optional[str],
+            not_modified: bool = False,
+            content: Optional[bytes] = None,
+    ):
+        self.data = data
+        self.etag = etag
+        self.last_modified = last_modified
+        self.not_modified = not_modified
+        self.content = content
+
+
+def build_conditional_headers(etag: Optional[str], last_modified: Optional[str]) -> dict:
+    headers = {}
+    if etag is not None:
+        headers["If-None-Match"] = etag
+    if last_modified is not None:
+        headers["If-Modified-Since"] = last_modified
+    return headers
+
+
+def processing_conditional_response(response: httpx.Response, codec: JsonCodec = None) -> ConditionalResponse:
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    if response.status_code == 304:
+        return ConditionalResponse(None, etag, last_modified, not_modified=True)
+    return ConditionalResponse(processing_response(response, codec), etag, last_modified, content=response.content)
+
+
+def get_retry_after(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_at - datetime.datetime.now(datetime.UTC)).total_seconds())
 
 
 OrderBy = list[tuple[str, Literal[1, -1]]]
 
+MAX_QUERY_LENGTH = 4000
+_CHUNKED_PARAMS = ("ids", "subscriber_ids")
+
 logger = logging.getLogger(__name__)
 
 
+def build_idempotency_key(item_id: ID) -> str:
+    return f"{item_id}:{uuid4().hex}"
+
+
 def _to_iterable[T](data: T | Iterable[T]) -> Iterable[T]:
     if not isinstance(data, Iterable) or isinstance(data, str):
         data = [data]
@@ -56,6 +122,8 @@ def build_query_params(
         skip: Optional[int] = None,
         limit: Optional[int] = None,
         order_by: Optional[OrderBy] = None,
+        after: Optional[str] = None,
+        fields: Optional[Iterable[str]] = None,
 ) -> dict:
     params = {}
     if ids is not None:
@@ -79,5 +147,146 @@ def build_query_params(
         params["skip"] = skip
     if limit is not None:
         params["limit"] = limit
+    if after is not None:
+        params["after"] = after
+    if fields is not None:
+        params["fields"] = build_projection(fields)
     params["order_by"] = [f"{col},{asc}" for col, asc in order_by] if order_by else ["created_at,1"]
     return params
+
+
+def build_projection(fields: Iterable[str]) -> list[str]:
+    fields = list(_to_iterable(fields))
+    return fields if "id" in fields else ["id", *fields]
+
+
+def _encoded_length(key: str, values: list[str]) -> int:
+    # Upper bound of the "&key=value" pairs: quote() with no safe characters escapes at least as much as httpx does
+    return sum(len(key) + len(quote(value, safe="")) + 2 for value in values)
+
+
+def _chunk_values(key: str, values: list[str], max_length: int) -> list[list[str]]:
+    chunks = [[]]
+    length = 0
+    for value in values:
+        size = _encoded_length(key, [value])
+        if chunks[-1] and length + size > max_length:
+            chunks.append([])
+            length = 0
+        chunks[-1].append(value)
+        length += size
+    return chunks
+
+
+def split_query_params(params: dict, max_length: int = MAX_QUERY_LENGTH) -> list[dict]:
+    if len(str(httpx.QueryParams(params))) <= max_length:
+        return [params]
+    lists = {key: list(dict.fromkeys(params[key])) for key in _CHUNKED_PARAMS if key in params}
+    if not lists:
+        return [params]
+
+    # Every chunk has to return its share of the first skip + limit rows; merge_pages cuts the window afterwards
+    window = {}
+    if params.get("limit") is not None:
+        window["limit"] = (params.get("skip") or 0) + params["limit"]
+    if params.get("skip") is not None:
+        window["skip"] = 0
+    if "fields" in params:
+        # merge_pages sorts on the order_by columns, so the chunks must load them
+        order_fields = (col.split(".")[0] for col, _ in _parse_order_by(params))
+        window["fields"] = list(dict.fromkeys([*params["fields"], *order_fields]))
+    base = {key: value for key, value in {**params, **window}.items() if key not in lists}
+    budget = max_length - len(str(httpx.QueryParams(base)))
+
+    largest = max(lists, key=lambda x: _encoded_length(x, lists[x]))
+    others = {key: values for key, values in lists.items() if key != largest}
+    rest = budget - sum(_encoded_length(key, values) for key, values in others.items())
+    chunks = _chunk_values(largest, lists[largest], rest) if rest > 0 else None
+    if others and (chunks is None or len(chunks) > 1):
+        # The filters are ANDed, so when the smaller list leaves little or no room each of its parts has to meet every
+        # part of the larger one. Giving both lists half of the budget needs the fewest such requests
+        other, values = next(iter(others.items()))
+        other_chunks = _chunk_values(other, values, budget // 2)
+        largest_chunks = _chunk_values(largest, lists[largest], budget // 2)
+        if chunks is None or len(other_chunks) * len(largest_chunks) < len(chunks):
+            return [{**base, other: x, largest: y} for x in other_chunks for y in largest_chunks]
+    return [{**base, **others, largest: chunk} for chunk in chunks]
+
+
+def _parse_order_by(params: dict) -> OrderBy:
+    result = []
+    for item in params.get("order_by", ["created_at,1"]):
+        col, asc = item.rsplit(",", 1)
+        result.append((col, int(asc)))
+    return result
+
+
+def _sort_key(col: str) -> Callable[[Any], tuple]:
+    # Nullable columns (paused_from, ...) cannot be compared with None, so missing values go first
+    getter = attrgetter(col)
+
+    def key(item: Any) -> tuple:
+        value = getter(item)
+        return value is not None, value
+
+    return key
+
+
+def merge_pages[T](pages: list[list[T]], params: dict) -> list[T]:
+    result = [item for page in pages for item in page]
+    for col, asc in reversed(_parse_order_by(params)):
+        result.sort(key=_sort_key(col), reverse=asc == -1)
+    skip = params.get("skip") or 0
+    limit = params.get("limit")
+    return result[skip:skip + limit] if limit is not None else result[skip:]
+
+
+def parse_count(json_data: Union[int, dict]) -> int:
+    if isinstance(json_data, dict):
+        return json_data["count"]
+    return json_data
+
+
+def build_keyset_order(order_by: Optional[OrderBy] = None) -> OrderBy:
+    order_by = list(order_by) if order_by else [("created_at", 1)]
+    if "id" not in (col for col, _ in order_by):
+        order_by.append(("id", 1))
+    return order_by
+
+
+def _cursor_value(value: Any) -> Any:
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+def build_cursor(item: Any, order_by: Optional[OrderBy] = None) -> str:
+    values = []
+    for col, _ in build_keyset_order(order_by):
+        try:
+            values.append(_cursor_value(attrgetter(col)(item)))
+        except AttributeError:
+            raise ValueError(f"Cannot build a cursor: '{type(item).__name__}' has no attribute '{col}'")
+    content = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(content).decode("ascii")
+
+
+def next_page_position(
+        page: list,
+        page_size: int,
+        position: dict,
+        order_by: Optional[OrderBy] = None,
+        keyset: bool = False,
+) -> Optional[dict]:
+    if len(page) < page_size:
+        return None
+    if keyset:
+        after = build_cursor(page[-1], order_by)
+        if after == position["after"]:
+            raise RuntimeError("The server ignored the 'after' cursor, keyset pagination is not supported")
+        return {"skip": None, "after": after}
+    return {"skip": position["skip"] + page_size, "after": None}
@@ -0,0 +1,328 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from subgatekit.client.base_client import SyncBaseClient, AsyncBaseClient
+from subgatekit.client.retry import is_transient_error
+from subgatekit.client.serailizers import serialize_subscription, serialize_plan
+from subgatekit.client.services import build_idempotency_key
+from subgatekit.entities import Subscription, Plan
+from subgatekit.utils import ID, Number
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS spooled_writes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    method TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    route TEXT NOT NULL,
+    body TEXT NOT NULL,
+    idempotency_key TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at REAL NOT NULL
+)
+"""
+
+
+class SpooledWrite:
+    def __init__(self, id: int, method: str, endpoint: str, route: str, body: str, idempotency_key: str,
+                 attempts: int):
+        self.id = id
+        self.method = method
+        self.endpoint = endpoint
+        self.route = route
+        self.body = body
+        self.idempotency_key = idempotency_key
+        self.attempts = attempts
+
+
+class SpoolStore:
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            # WAL with synchronous=NORMAL survives a crash of the process, which is what the spool is for
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(_SCHEMA)
+
+    def append(self, method: str, endpoint: str, route: str, body: str, idempotency_key: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO spooled_writes (method, endpoint, route, body, idempotency_key, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (method, endpoint, route, body, idempotency_key, time.time()),
+            )
+
+    def peek(self, limit: int) -> list[SpooledWrite]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, method, endpoint, route, body, idempotency_key, attempts FROM spooled_writes "
+                "WHERE error IS NULL ORDER BY id LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [SpooledWrite(*row) for row in rows]
+
+    def complete(self, ids: list[int]) -> None:
+        if not ids:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("DELETE FROM spooled_writes WHERE id = ?", [(x,) for x in ids])
+            self._conn.execute("COMMIT")
+
+    def record_attempt(self, write_id: int) -> None:
+        with self._lock:
+            self._conn.execute("UPDATE spooled_writes SET attempts = attempts + 1 WHERE id = ?", (write_id,))
+
+    def fail(self, write_id: int, error: str) -> None:
+        with self._lock:
+            self._conn.execute("UPDATE spooled_writes SET error = ? WHERE id = ?", (error, write_id))
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM spooled_writes WHERE error IS NULL").fetchone()[0]
+
+    def failed_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM spooled_writes WHERE error IS NOT NULL").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class _WriteSpool:
+    def __init__(self, path: str, batch_size: int, drain_interval: float, backoff_base: float, backoff_max: float):
+        self._store = SpoolStore(path)
+        self._batch_size = batch_size
+        self._drain_interval = drain_interval
+        self._backoff_base = backoff_base
+        self._backoff_max = backoff_max
+        self._failures = 0
+        self._closed = False
+
+    @staticmethod
+    def _subscription_write(sub: Subscription) -> tuple:
+        body = json.dumps(serialize_subscription(sub))
+        return "PUT", f"/subscription/{sub.id}", "/subscription/{id}", body, build_idempotency_key(sub.id)
+
+    @staticmethod
+    def _plan_write(plan: Plan) -> tuple:
+        body = json.dumps(serialize_plan(plan))
+        return "PUT", f"/plan/{plan.id}", "/plan/{id}", body, build_idempotency_key(plan.id)
+
+    @staticmethod
+    def _usage_write(sub_id: ID, deltas: dict[str, Number]) -> tuple:
+        body = json.dumps([{"code": code, "delta": delta} for code, delta in deltas.items()])
+        url = f"/subscription/{sub_id}/usages/increase"
+        return "POST", url, "/subscription/{id}/usages/increase", body, build_idempotency_key(sub_id)
+
+    def _next_delay(self) -> float:
+        if self._failures == 0:
+            return self._drain_interval
+        return min(self._backoff_max, self._backoff_base * 2 ** (self._failures - 1))
+
+    def _handle_result(self, write: SpooledWrite, exc: Optional[Exception]) -> bool:
+        # Returns False when draining has to stop; later writes must not overtake a write that is still pending
+        if exc is None:
+            self._failures = 0
+            return True
+        if is_transient_error(exc):
+            self._failures += 1
+            self._store.record_attempt(write.id)
+            return False
+        logger.error(f"Spooled {write.method} {write.endpoint} was rejected: {exc}")
+        self._store.fail(write.id, repr(exc))
+        return True
+
+    def pending_count(self) -> int:
+        return self._store.pending_count()
+
+    def failed_count(self) -> int:
+        return self._store.failed_count()
+
+
+class SyncWriteSpool(_WriteSpool):
+    def __init__(
+            self,
+            base_client: SyncBaseClient,
+            path: str,
+            batch_size: int = 100,
+            drain_interval: float = 0.5,
+            backoff_base: float = 0.5,
+            backoff_max: float = 30.0,
+    ):
+        super().__init__(path, batch_size, drain_interval, backoff_base, backoff_max)
+        self._base_client = base_client
+        self._drain_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._wakeup.set()
+        self._thread = threading.Thread(target=self._run, name="subgate-write-spool", daemon=True)
+        self._thread.start()
+
+    def update_subscription(self, sub: Subscription) -> None:
+        self._append(self._subscription_write(sub))
+
+    def update_plan(self, plan: Plan) -> None:
+        self._append(self._plan_write(plan))
+
+    def increase_usage(self, sub_id: ID, code: str, delta: Number) -> None:
+        self.increase_usages(sub_id, {code: delta})
+
+    def increase_usages(self, sub_id: ID, deltas: dict[str, Number]) -> None:
+        self._append(self._usage_write(sub_id, deltas))
+
+    def _append(self, write: tuple) -> None:
+        if self._closed:
+            raise RuntimeError("The write spool is closed")
+        self._store.append(*write)
+
+    def drain(self) -> int:
+        delivered = 0
+        with self._drain_lock:
+            while writes := self._store.peek(self._batch_size):
+                completed = []
+                for write in writes:
+                    exc = self._send(write)
+                    if exc is None:
+                        completed.append(write.id)
+                    if not self._handle_result(write, exc):
+                        self._store.complete(completed)
+                        return delivered + len(completed)
+                self._store.complete(completed)
+                delivered += len(completed)
+        return delivered
+
+    def _send(self, write: SpooledWrite) -> Optional[Exception]:
+        try:
+            self._base_client.request(write.method, write.endpoint, json=json.loads(write.body),
+                                      idempotency_key=write.idempotency_key, route=write.route)
+        except Exception as exc:
+            return exc
+        return None
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(self._next_delay())
+            self._wakeup.clear()
+            try:
+                self.drain()
+            except Exception:
+                logger.exception("Draining the write spool failed")
+            if self._closed:
+                return
+
+    def close(self) -> None:
+        self._closed = True
+        self._wakeup.set()
+        self._thread.join()
+        self._store.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class AsyncWriteSpool(_WriteSpool):
+    def __init__(
+            self,
+            base_client: AsyncBaseClient,
+            path: str,
+            batch_size: int = 100,
+            drain_interval: float = 0.5,
+            backoff_base: float = 0.5,
+            backoff_max: float = 30.0,
+    ):
+        super().__init__(path, batch_size, drain_interval, backoff_base, backoff_max)
+        self._base_client = base_client
+        self._drain_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        self._task: Optional[asyncio.Task] = None
+
+    async def update_subscription(self, sub: Subscription) -> None:
+        await self._append(self._subscription_write(sub))
+
+    async def update_plan(self, plan: Plan) -> None:
+        await self._append(self._plan_write(plan))
+
+    async def increase_usage(self, sub_id: ID, code: str, delta: Number) -> None:
+        await self.increase_usages(sub_id, {code: delta})
+
+    async def increase_usages(self, sub_id: ID, deltas: dict[str, Number]) -> None:
+        await self._append(self._usage_write(sub_id, deltas))
+
+    async def _append(self, write: tuple) -> None:
+        if self._closed:
+            raise RuntimeError("The write spool is closed")
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        await asyncio.to_thread(self._store.append, *write)
+
+    def start(self) -> None:
+        # Picks up writes left over by a previous process without waiting for a new one
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def drain(self) -> int:
+        delivered = 0
+        async with self._drain_lock:
+            while writes := await asyncio.to_thread(self._store.peek, self._batch_size):
+                completed = []
+                for write in writes:
+                    exc = await self._send(write)
+                    if exc is None:
+                        completed.append(write.id)
+                    if not await asyncio.to_thread(self._handle_result, write, exc):
+                        await asyncio.to_thread(self._store.complete, completed)
+                        return delivered + len(completed)
+                await asyncio.to_thread(self._store.complete, completed)
+                delivered += len(completed)
+        return delivered
+
+    async def _send(self, write: SpooledWrite) -> Optional[Exception]:
+        try:
+            await self._base_client.request(write.method, write.endpoint, json=json.loads(write.body),
+                                            idempotency_key=write.idempotency_key, route=write.route)
+        except Exception as exc:
+            return exc
+        return None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._next_delay())
+            except TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.drain()
+            except Exception:
+                logger.exception("Draining the write spool failed")
+            if self._closed:
+                return
+
+    async def close(self) -> None:
+        self._closed = True
+        if self._task is None:
+            await self.drain()
+        else:
+            self._wakeup.set()
+            await self._task
+        self._store.close()
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
@@ -0,0 +1,60 @@
+import codecs
+import json
+from typing import Any
+
+_WHITESPACE = " \t\n\r"
+_DELIMITERS = _WHITESPACE + ",]"
+
+
+class JsonArrayParser:
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._pos = 0
+        self._started = False
+        self._expect_comma = False
+        self._finished = False
+
+    def feed(self, chunk: bytes, final: bool = False) -> list[Any]:
+        self._buffer += self._text_decoder.decode(chunk, final)
+        items = []
+        while not self._finished and self._skip_whitespace():
+            char = self._buffer[self._pos]
+            if not self._started:
+                if char != "[":
+                    raise ValueError(f"Expected a JSON array, got '{char}'")
+                self._started = True
+                self._pos += 1
+            elif char == "]":
+                self._finished = True
+                self._pos += 1
+            elif self._expect_comma:
+                if char != ",":
+                    raise ValueError(f"Expected ',' or ']' at position {self._pos}, got '{char}'")
+                self._expect_comma = False
+                self._pos += 1
+            else:
+                try:
+                    item, end = self._decoder.raw_decode(self._buffer, self._pos)
+                except json.JSONDecodeError:
+                    if final:
+                        raise
+                    break
+                # A number cut by the chunk boundary decodes as a shorter one, so wait for a delimiter
+                if not final and (end == len(self._buffer) or self._buffer[end] not in _DELIMITERS):
+                    break
+                items.append(item)
+                self._pos = end
+                self._expect_comma = True
+
+        self._buffer = self._buffer[self._pos:]
+        self._pos = 0
+        if final and not self._finished:
+            raise ValueError("Unexpected end of the JSON array")
+        return items
+
+    def _skip_whitespace(self) -> bool:
+        while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+            self._pos += 1
+        return self._pos < len(self._buffer)
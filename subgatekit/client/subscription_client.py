@@ -1,26 +1,110 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
 from datetime import datetime
-from typing import Iterable, Optional, Union
+from typing import Iterable, Optional, Union, Iterator, AsyncIterator, Callable, Any
 from uuid import UUID
 
 from subgatekit.client.base_client import SyncBaseClient, AsyncBaseClient
-from subgatekit.client.deserializers import deserialize_subscription
+from subgatekit.client.batch_loader import AsyncBatchLoader
+from subgatekit.client.bulk import BulkResult, sync_run_bulk, async_run_bulk, BULK_MAX_CONCURRENCY
+from subgatekit.client.cache import CachePolicy, CacheStats, SyncLoadingCache, AsyncLoadingCache, TTLCache, MISSING
+from subgatekit.client.change_tracking import (take_snapshot, get_snapshot, build_change_set, take_fingerprint,
+                                                is_unchanged, UpdateStats, MERGE_PATCH_HEADERS)
+from subgatekit.client.deserializers import deserialize_subscription, deserialize_partial_subscription
+from subgatekit.client.fan_out import sync_fan_out, async_fan_out
+from subgatekit.client.revalidation import RevalidationCache, build_cache_key
 from subgatekit.client.serailizers import (
     serialize_subscription,
 )
-from subgatekit.client.services import build_query_params, OrderBy
-from subgatekit.entities import Subscription
+from subgatekit.client.services import (build_query_params, build_idempotency_key, build_keyset_order,
+                                         build_projection, next_page_position, parse_count,
+                                         split_query_params, merge_pages, OrderBy)
+from subgatekit.entities import Subscription, PartialSubscription
 from subgatekit.enums import SubscriptionStatus
-from subgatekit.utils import ID
+from subgatekit.exceptions import ItemNotExist
+from subgatekit.utils import ID, Number
 
 
 class SyncSubscriptionClient:
-    def __init__(self, base_client: SyncBaseClient):
+    def __init__(
+            self,
+            base_client: SyncBaseClient,
+            partial_updates: bool = False,
+            skip_unchanged: bool = False,
+            cache: CachePolicy = None,
+    ):
         self._base_client = base_client
+        self._partial_updates = partial_updates
+        self._skip_unchanged = skip_unchanged
+        self._update_stats = UpdateStats()
+        self._current_cache = SyncLoadingCache(cache) if cache is not None else None
+        self._revalidation = None
+        if cache is not None and cache.revalidate:
+            self._revalidation = RevalidationCache(cache.max_size, cache.stale_if_error, base_client.codec)
+        self._missing = TTLCache(cache.max_size, cache.negative_ttl) if cache is not None else None
+
+    @property
+    def update_stats(self) -> UpdateStats:
+        return self._update_stats
+
+    @property
+    def cache_stats(self) -> Optional[CacheStats]:
+        return self._current_cache.stats if self._current_cache is not None else None
+
+    def invalidate(self, sub_id: ID = None, subscriber_id: str = None) -> None:
+        if self._current_cache is None:
+            return
+        if sub_id is None and subscriber_id is None:
+            self._current_cache.clear()
+            self._missing.clear()
+            if self._revalidation is not None:
+                self._revalidation.clear()
+            return
+        if subscriber_id is not None:
+            self._current_cache.delete(subscriber_id)
+        if sub_id is not None:
+            self._current_cache.delete_where(lambda x: x is not None and str(x.id) == str(sub_id))
+            self._missing.delete(str(sub_id))
+        if self._revalidation is not None:
+            # stale_if_error must not bring back a subscription that was changed or deleted elsewhere
+            self._revalidation.evict(
+                lambda x: x.get("id") == str(sub_id) or subscriber_id and x.get("subscriber_id") == subscriber_id,
+            )
+
+    def _track(self, sub: Subscription, data: dict) -> None:
+        if self._partial_updates:
+            take_snapshot(sub, data)
+        if self._skip_unchanged:
+            take_fingerprint(sub, data)
+
+    def _deserialize(self, data: dict) -> Subscription:
+        sub = deserialize_subscription(data)
+        if self._partial_updates or self._skip_unchanged:
+            self._track(sub, serialize_subscription(sub))
+        return sub
+
+    def _get(self, url: str, route: Optional[str], params: Optional[dict], deserialize: Callable[[Any], Any]) -> Any:
+        if self._revalidation is None:
+            return deserialize(self._base_client.request("GET", url, route=route, params=params))
+        key = build_cache_key(url, params)
+        entry = self._revalidation.lookup(key)
+        validators = entry.validators() if entry is not None else {}
+        try:
+            response = self._base_client.conditional_request("GET", url, route=route, params=params, **validators)
+        except Exception as exc:
+            if not self._revalidation.can_serve_stale(key, entry, exc):
+                raise
+            return self._revalidation.load(entry, deserialize)
+        return self._revalidation.resolve(key, entry, response, deserialize)
 
     def create(self, sub: Subscription) -> None:
         url = "/subscription"
         data = serialize_subscription(sub)
-        self._base_client.request("POST", url, json=data)
+        key = build_idempotency_key(sub.id)
+        self._base_client.request("POST", url, json=data, idempotency_key=key)
+        self._track(sub, data)
+        self.invalidate(sub.id, sub.subscriber_id)
 
     def create_then_get(self, sub: Subscription) -> Subscription:
         self.create(sub)
@@ -29,11 +113,53 @@ class SyncSubscriptionClient:
     def update(self, sub: Subscription) -> None:
         url = f"/subscription/{sub.id}"
         data = serialize_subscription(sub)
-        self._base_client.request("PUT", url, json=data)
+        key = build_idempotency_key(sub.id)
+        if self._skip_unchanged and is_unchanged(sub, data):
+            self._update_stats.record_skipped()
+            return
+        snapshot = get_snapshot(sub) if self._partial_updates else None
+        if snapshot is not None:
+            changes = build_change_set(snapshot, data)
+            if not changes:
+                self._update_stats.record_skipped()
+                return
+            self._base_client.request("PATCH", url, json=changes, idempotency_key=key, route="/subscription/{id}",
+                                      headers=MERGE_PATCH_HEADERS)
+        else:
+            self._base_client.request("PUT", url, json=data, idempotency_key=key, route="/subscription/{id}")
+        self._update_stats.record_sent()
+        self._track(sub, data)
+        self.invalidate(sub.id, sub.subscriber_id)
+
+    def create_many(
+            self,
+            subs: Iterable[Subscription],
+            max_concurrency: int = BULK_MAX_CONCURRENCY,
+    ) -> BulkResult:
+        return sync_run_bulk(self.create, subs, max_concurrency)
+
+    def update_many(
+            self,
+            subs: Iterable[Subscription],
+            max_concurrency: int = BULK_MAX_CONCURRENCY,
+    ) -> BulkResult:
+        return sync_run_bulk(self.update, subs, max_concurrency)
+
+    def increase_usage(self, sub_id: ID, code: str, delta: Number, idempotency_key: str = None) -> None:
+        self.increase_usages(sub_id, {code: delta}, idempotency_key)
+
+    def increase_usages(self, sub_id: ID, deltas: dict[str, Number], idempotency_key: str = None) -> None:
+        url = f"/subscription/{sub_id}/usages/increase"
+        data = [{"code": code, "delta": delta} for code, delta in deltas.items()]
+        key = idempotency_key if idempotency_key is not None else build_idempotency_key(sub_id)
+        self._base_client.request("POST", url, json=data, idempotency_key=key,
+                                  route="/subscription/{id}/usages/increase")
+        self.invalidate(sub_id)
 
     def delete_by_id(self, sub_id: ID) -> None:
         url = f"/subscription/{sub_id}"
-        self._base_client.request("DELETE", url)
+        self._base_client.request("DELETE", url, route="/subscription/{id}")
+        self.invalidate(sub_id)
 
     def delete_selected(
             self,
@@ -54,12 +180,28 @@ class SyncSubscriptionClient:
             expiration_date_lt=expiration_date_lt,
             expiration_date_lte=expiration_date_lte,
         )
-        self._base_client.request("DELETE", f"/subscription", params=sby)
+        chunks = split_query_params(sby)
+        sync_fan_out(lambda x: self._base_client.request("DELETE", f"/subscription", params=x), chunks)
+        self.invalidate()
+
+    def get_by_id(self, sub_id: ID, fields: Iterable[str] = None) -> Union[Subscription, PartialSubscription]:
+        missing = self._missing.get(str(sub_id)) if self._missing is not None else MISSING
+        if missing is not MISSING:
+            raise ItemNotExist(missing.item_type, missing.lookup_field_value, missing.lookup_field_key)
+        try:
+            return self._get_by_id(sub_id, fields)
+        except ItemNotExist as exc:
+            if self._missing is not None:
+                self._missing.set(str(sub_id), exc)
+            raise
 
-    def get_by_id(self, sub_id: ID) -> Subscription:
+    def _get_by_id(self, sub_id: ID, fields: Iterable[str] = None) -> Union[Subscription, PartialSubscription]:
         url = f"/subscription/{sub_id}"
-        json_data = self._base_client.request("GET", url)
-        return deserialize_subscription(json_data)
+        if fields is not None:
+            params = {"fields": build_projection(fields)}
+            json_data = self._base_client.request("GET", url, route="/subscription/{id}", params=params)
+            return deserialize_partial_subscription(json_data)
+        return self._get(url, "/subscription/{id}", None, self._deserialize)
 
     def get_selected(
             self,
@@ -73,29 +215,223 @@ class SyncSubscriptionClient:
             order_by: OrderBy = None,
             skip=0,
             limit=100,
-    ) -> list[Subscription]:
+            after: str = None,
+            fields: Iterable[str] = None,
+    ) -> Union[list[Subscription], list[PartialSubscription]]:
+        url = f"/subscription"
+        if after is not None:
+            order_by = build_keyset_order(order_by)
+            skip = None
+        params = build_query_params(ids, subscriber_ids, statuses, expiration_date_gte, expiration_date_gt,
+                                    expiration_date_lte, expiration_date_lt, skip, limit, order_by, after, fields)
+        deserialize = deserialize_partial_subscription if fields is not None else self._deserialize
+        chunks = split_query_params(params)
+        deserialize_page = lambda data: [deserialize(x) for x in data]
+        pages = sync_fan_out(lambda x: self._get(url, None, x, deserialize_page), chunks)
+        return pages[0] if len(chunks) == 1 else merge_pages(pages, params)
+
+    def iter_selected(
+            self,
+            ids: Union[UUID, Iterable[UUID]] = None,
+            subscriber_ids: Union[str, Iterable[str]] = None,
+            statuses: Union[SubscriptionStatus, Iterable[SubscriptionStatus]] = None,
+            expiration_date_gt: datetime = None,
+            expiration_date_gte: datetime = None,
+            expiration_date_lt: datetime = None,
+            expiration_date_lte: datetime = None,
+            order_by: OrderBy = None,
+            page_size=100,
+            keyset=False,
+    ) -> Iterator[Subscription]:
+        filters = dict(ids=ids, subscriber_ids=subscriber_ids, statuses=statuses,
+                       expiration_date_gt=expiration_date_gt, expiration_date_gte=expiration_date_gte,
+                       expiration_date_lt=expiration_date_lt, expiration_date_lte=expiration_date_lte,
+                       limit=page_size)
+        order_by = build_keyset_order(order_by) if keyset else order_by
+        position = {"skip": None if keyset else 0, "after": None}
+        executor = ThreadPoolExecutor(max_workers=1)
+        future = executor.submit(self.get_selected, **filters, order_by=order_by, **position)
+        try:
+            while future is not None:
+                page = future.result()
+                future = None
+                position = next_page_position(page, page_size, position, order_by, keyset)
+                if position is not None:
+                    future = executor.submit(self.get_selected, **filters, order_by=order_by, **position)
+                yield from page
+        finally:
+            # Closing the iterator early must not wait for the page that is being prefetched
+            if future is not None:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def stream_selected(
+            self,
+            ids: Union[UUID, Iterable[UUID]] = None,
+            subscriber_ids: Union[str, Iterable[str]] = None,
+            statuses: Union[SubscriptionStatus, Iterable[SubscriptionStatus]] = None,
+            expiration_date_gt: datetime = None,
+            expiration_date_gte: datetime = None,
+            expiration_date_lt: datetime = None,
+            expiration_date_lte: datetime = None,
+            order_by: OrderBy = None,
+            skip=0,
+            limit=100,
+    ) -> Iterator[Subscription]:
         url = f"/subscription"
         params = build_query_params(ids, subscriber_ids, statuses, expiration_date_gte, expiration_date_gt,
                                     expiration_date_lte, expiration_date_lt, skip, limit, order_by)
-        json_data = self._base_client.request("GET", url, params=params)
-        return [deserialize_subscription(x) for x in json_data]
+        for json_data in self._base_client.stream("GET", url, params=params):
+            yield self._deserialize(json_data)
+
+    def count_selected(
+            self,
+            ids: Union[UUID, Iterable[UUID]] = None,
+            subscriber_ids: Union[str, Iterable[str]] = None,
+            statuses: Union[SubscriptionStatus, Iterable[SubscriptionStatus]] = None,
+            expiration_date_gt: datetime = None,
+            expiration_date_gte: datetime = None,
+            expiration_date_lt: datetime = None,
+            expiration_date_lte: datetime = None,
+    ) -> int:
+        url = f"/subscription/count"
+        params = build_query_params(ids, subscriber_ids, statuses, expiration_date_gte, expiration_date_gt,
+                                    expiration_date_lte, expiration_date_lt)
+        chunks = split_query_params(params)
+        counts = sync_fan_out(lambda x: self._base_client.request("GET", url, params=x), chunks)
+        return sum(parse_count(x) for x in counts)
+
+    def exists(
+            self,
+            ids: Union[UUID, Iterable[UUID]] = None,
+            subscriber_ids: Union[str, Iterable[str]] = None,
+            statuses: Union[SubscriptionStatus, Iterable[SubscriptionStatus]] = None,
+            expiration_date_gt: datetime = None,
+            expiration_date_gte: datetime = None,
+            expiration_date_lt: datetime = None,
+            expiration_date_lte: datetime = None,
+    ) -> bool:
+        url = f"/subscription"
+        params = build_query_params(ids, subscriber_ids, statuses, expiration_date_gte, expiration_date_gt,
+                                    expiration_date_lte, expiration_date_lt, limit=1, fields=["id"])
+        chunks = split_query_params(params)
+        pages = sync_fan_out(lambda x: self._base_client.request("GET", url, params=x), chunks)
+        return any(len(x) > 0 for x in pages)
 
     def get_current_subscription(self, subscriber_id: str) -> Optional[Subscription]:
+        if self._current_cache is None:
+            return self._get_current_subscription(subscriber_id)
+        # Callers get their own copy, so mutating a returned subscription cannot corrupt the cache
+        load = lambda: self._get_current_subscription(subscriber_id)
+        sub = self._current_cache.get_or_load(subscriber_id, load)
+        return deepcopy(sub)
+
+    def _get_current_subscription(self, subscriber_id: str) -> Optional[Subscription]:
         url = f"/subscription/active-one/{subscriber_id}"
-        json_data = self._base_client.request("GET", url)
-        if json_data:
-            return deserialize_subscription(json_data)
-        return None
+        json_data = self._base_client.request("GET", url, route="/subscription/active-one/{subscriber_id}")
+        return self._deserialize(json_data) if json_data else None
 
 
 class AsyncSubscriptionClient:
-    def __init__(self, base_client: AsyncBaseClient):
+    def __init__(
+            self,
+            base_client: AsyncBaseClient,
+            batch_window: float = None,
+            partial_updates: bool = False,
+            skip_unchanged: bool = False,
+            cache: CachePolicy = None,
+    ):
         self._base_client = base_client
+        self._partial_updates = partial_updates
+        self._skip_unchanged = skip_unchanged
+        self._update_stats = UpdateStats()
+        self._current_cache = AsyncLoadingCache(cache) if cache is not None else None
+        self._revalidation = None
+        if cache is not None and cache.revalidate:
+            self._revalidation = RevalidationCache(cache.max_size, cache.stale_if_error, base_client.codec)
+        self._missing = TTLCache(cache.max_size, cache.negative_ttl) if cache is not None else None
+        self._loader = None
+        if batch_window is not None:
+            self._loader = AsyncBatchLoader(
+                self._get_json_by_ids,
+                lambda sub_id: ItemNotExist("Subscription", sub_id, "id"),
+                window=batch_window,
+            )
+
+    @property
+    def update_stats(self) -> UpdateStats:
+        return self._update_stats
+
+    @property
+    def cache_stats(self) -> Optional[CacheStats]:
+        return self._current_cache.stats if self._current_cache is not None else None
+
+    def invalidate(self, sub_id: ID = None, subscriber_id: str = None) -> None:
+        if self._current_cache is None:
+            return
+        if sub_id is None and subscriber_id is None:
+            self._current_cache.clear()
+            self._missing.clear()
+            if self._revalidation is not None:
+                self._revalidation.clear()
+            return
+        if subscriber_id is not None:
+            self._current_cache.delete(subscriber_id)
+        if sub_id is not None:
+            self._current_cache.delete_where(lambda x: x is not None and str(x.id) == str(sub_id))
+            self._missing.delete(str(sub_id))
+        if self._revalidation is not None:
+            # stale_if_error must not bring back a subscription that was changed or deleted elsewhere
+            self._revalidation.evict(
+                lambda x: x.get("id") == str(sub_id) or subscriber_id and x.get("subscriber_id") == subscriber_id,
+            )
+
+    def _track(self, sub: Subscription, data: dict) -> None:
+        if self._partial_updates:
+            take_snapshot(sub, data)
+        if self._skip_unchanged:
+            take_fingerprint(sub, data)
+
+    def _deserialize(self, data: dict) -> Subscription:
+        sub = deserialize_subscription(data)
+        if self._partial_updates or self._skip_unchanged:
+            self._track(sub, serialize_subscription(sub))
+        return sub
+
+    async def _get_json_by_ids(self, sub_ids: list[str]) -> dict[str, dict]:
+        params = build_query_params(ids=sub_ids, limit=len(sub_ids))
+        chunks = split_query_params(params)
+        pages = await async_fan_out(lambda x: self._base_client.request("GET", "/subscription", params=x), chunks)
+        return {x["id"]: x for page in pages for x in page}
+
+    async def _get(
+            self,
+            url: str,
+            route: Optional[str],
+            params: Optional[dict],
+            deserialize: Callable[[Any], Any],
+    ) -> Any:
+        if self._revalidation is None:
+            return deserialize(await self._base_client.request("GET", url, route=route, params=params))
+        key = build_cache_key(url, params)
+        entry = self._revalidation.lookup(key)
+        validators = entry.validators() if entry is not None else {}
+        try:
+            response = await self._base_client.conditional_request("GET", url, route=route, params=params,
+                                                                   **validators)
+        except Exception as exc:
+            if not self._revalidation.can_serve_stale(key, entry, exc):
+                raise
+            return self._revalidation.load(entry, deserialize)
+        return self._revalidation.resolve(key, entry, response, deserialize)
 
     async def create(self, sub: Subscription) -> None:
         url = "/subscription"
         data = serialize_subscription(sub)
-        await self._base_client.request("POST", url, json=data)
+        key = build_idempotency_key(sub.id)
+        await self._base_client.request("POST", url, json=data, idempotency_key=key)
+        self._track(sub, data)
+        self.invalidate(sub.id, sub.subscriber_id)
 
     async def create_then_get(self, sub: Subscription) -> Subscription:
         await self.create(sub)
@@ -104,11 +440,53 @@ class AsyncSubscriptionClient:
     async def update(self, sub: Subscription) -> None:
         url = f"/subscription/{sub.id}"
         data = serialize_subscription(sub)
-        await self._base_client.request("PUT", url, json=data)
+        key = build_idempotency_key(sub.id)
+        if self._skip_unchanged and is_unchanged(sub, data):
+            self._update_stats.record_skipped()
+            return
+        snapshot = get_snapshot(sub) if self._partial_updates else None
+        if snapshot is not None:
+            changes = build_change_set(snapshot, data)
+            if not changes:
+                self._update_stats.record_skipped()
+                return
+            await self._base_client.request("PATCH", url, json=changes, idempotency_key=key, route="/subscription/{id}",
+                                            headers=MERGE_PATCH_HEADERS)
+        else:
+            await self._base_client.request("PUT", url, json=data, idempotency_key=key, route="/subscription/{id}")
+        self._update_stats.record_sent()
+        self._track(sub, data)
+        self.invalidate(sub.id, sub.subscriber_id)
+
+    async def create_many(
+            self,
+            subs: Iterable[Subscription],
+            max_concurrency: int = BULK_MAX_CONCURRENCY,
+    ) -> BulkResult:
+        return await async_run_bulk(self.create, subs, max_concurrency)
+
+    async def update_many(
+            self,
+            subs: Iterable[Subscription],
+            max_concurrency: int = BULK_MAX_CONCURRENCY,
+    ) -> BulkResult:
+        return await async_run_bulk(self.update, subs, max_concurrency)
+
+    async def increase_usage(self, sub_id: ID, code: str, delta: Number, idempotency_key: str = None) -> None:
+        await self.increase_usages(sub_id, {code: delta}, idempotency_key)
+
+    async def increase_usages(self, sub_id: ID, deltas: dict[str, Number], idempotency_key: str = None) -> None:
+        url = f"/subscription/{sub_id}/usages/increase"
+        data = [{"code": code, "delta": delta} for code, delta in deltas.items()]
+        key = idempotency_key if idempotency_key is not None else build_idempotency_key(sub_id)
+        await self._base_client.request("POST", url, json=data, idempotency_key=key,
+                                        route="/subscription/{id}/usages/increase")
+        self.invalidate(sub_id)
 
     async def delete_by_id(self, sub_id: ID) -> None:
         url = f"/subscription/{sub_id}"
-        await self._base_client.request("DELETE", url)
+        await self._base_client.request("DELETE", url, route="/subscription/{id}")
+        self.invalidate(sub_id)
 
     async def delete_selected(
             self,
@@ -125,12 +503,31 @@ class AsyncSubscriptionClient:
             expiration_date_gte=expiration_date_gte,
             expiration_date_lt=expiration_date_lt,
         )
-        await self._base_client.request("DELETE", f"/subscription", params=sby)
+        chunks = split_query_params(sby)
+        await async_fan_out(lambda x: self._base_client.request("DELETE", f"/subscription", params=x), chunks)
+        self.invalidate()
 
-    async def get_by_id(self, sub_id: ID) -> Subscription:
+    async def get_by_id(self, sub_id: ID, fields: Iterable[str] = None) -> Union[Subscription, PartialSubscription]:
+        missing = self._missing.get(str(sub_id)) if self._missing is not None else MISSING
+        if missing is not MISSING:
+            raise ItemNotExist(missing.item_type, missing.lookup_field_value, missing.lookup_field_key)
+        try:
+            return await self._get_by_id(sub_id, fields)
+        except ItemNotExist as exc:
+            if self._missing is not None:
+                self._missing.set(str(sub_id), exc)
+            raise
+
+    async def _get_by_id(self, sub_id: ID, fields: Iterable[str] = None) -> Union[Subscription, PartialSubscription]:
         url = f"/subscription/{sub_id}"
-        json_data = await self._base_client.request("GET", url)
-        return deserialize_subscription(json_data)
+        if fields is not None:
+            params = {"fields": build_projection(fields)}
+            json_data = await self._base_client.request("GET", url, route="/subscription/{id}", params=params)
+            return deserialize_partial_subscription(json_data)
+        if self._loader is not None:
+            json_data = await self._loader.load(str(sub_id))
+            return self._deserialize(json_data)
+        return await self._get(url, "/subscription/{id}", None, self._deserialize)
 
     async def get_selected(
             self,
@@ -144,16 +541,116 @@ class AsyncSubscriptionClient:
             order_by: OrderBy = None,
             skip=0,
             limit=100,
-    ) -> list[Subscription]:
+            after: str = None,
+            fields: Iterable[str] = None,
+    ) -> Union[list[Subscription], list[PartialSubscription]]:
+        url = f"/subscription"
+        if after is not None:
+            order_by = build_keyset_order(order_by)
+            skip = None
+        params = build_query_params(ids, subscriber_ids, statuses, expiration_date_gte, expiration_date_gt,
+                                    expiration_date_lte, expiration_date_lt, skip, limit, order_by, after, fields)
+        deserialize = deserialize_partial_subscription if fields is not None else self._deserialize
+        chunks = split_query_params(params)
+        deserialize_page = lambda data: [deserialize(x) for x in data]
+        pages = await async_fan_out(lambda x: self._get(url, None, x, deserialize_page), chunks)
+        return pages[0] if len(chunks) == 1 else merge_pages(pages, params)
+
+    async def aiter_selected(
+            self,
+            ids: Union[UUID, Iterable[UUID]] = None,
+            subscriber_ids: Union[str, Iterable[str]] = None,
+            statuses: Union[SubscriptionStatus, Iterable[SubscriptionStatus]] = None,
+            expiration_date_lt: datetime = None,
+            expiration_date_lte: datetime = None,
+            expiration_date_gt: datetime = None,
+            expiration_date_gte: datetime = None,
+            order_by: OrderBy = None,
+            page_size=100,
+            keyset=False,
+    ) -> AsyncIterator[Subscription]:
+        filters = dict(ids=ids, subscriber_ids=subscriber_ids, statuses=statuses,
+                       expiration_date_gt=expiration_date_gt, expiration_date_gte=expiration_date_gte,
+                       expiration_date_lt=expiration_date_lt, expiration_date_lte=expiration_date_lte,
+                       limit=page_size)
+        order_by = build_keyset_order(order_by) if keyset else order_by
+        position = {"skip": None if keyset else 0, "after": None}
+        task = asyncio.ensure_future(self.get_selected(**filters, order_by=order_by, **position))
+        try:
+            while task is not None:
+                page = await task
+                task = None
+                position = next_page_position(page, page_size, position, order_by, keyset)
+                if position is not None:
+                    task = asyncio.ensure_future(self.get_selected(**filters, order_by=order_by, **position))
+                for sub in page:
+                    yield sub
+        finally:
+            if task is not None:
+                task.cancel()
+
+    async def astream_selected(
+            self,
+            ids: Union[UUID, Iterable[UUID]] = None,
+            subscriber_ids: Union[str, Iterable[str]] = None,
+            statuses: Union[SubscriptionStatus, Iterable[SubscriptionStatus]] = None,
+            expiration_date_lt: datetime = None,
+            expiration_date_lte: datetime = None,
+            expiration_date_gt: datetime = None,
+            expiration_date_gte: datetime = None,
+            order_by: OrderBy = None,
+            skip=0,
+            limit=100,
+    ) -> AsyncIterator[Subscription]:
         url = f"/subscription"
         params = build_query_params(ids, subscriber_ids, statuses, expiration_date_gte, expiration_date_gt,
                                     expiration_date_lte, expiration_date_lt, skip, limit, order_by)
-        json_data = await self._base_client.request("GET", url, params=params)
-        return [deserialize_subscription(x) for x in json_data]
+        async for json_data in self._base_client.stream("GET", url, params=params):
+            yield self._deserialize(json_data)
+
+    async def count_selected(
+            self,
+            ids: Union[UUID, Iterable[UUID]] = None,
+            subscriber_ids: Union[str, Iterable[str]] = None,
+            statuses: Union[SubscriptionStatus, Iterable[SubscriptionStatus]] = None,
+            expiration_date_gt: datetime = None,
+            expiration_date_gte: datetime = None,
+            expiration_date_lt: datetime = None,
+            expiration_date_lte: datetime = None,
+    ) -> int:
+        url = f"/subscription/count"
+        params = build_query_params(ids, subscriber_ids, statuses, expiration_date_gte, expiration_date_gt,
+                                    expiration_date_lte, expiration_date_lt)
+        chunks = split_query_params(params)
+        counts = await async_fan_out(lambda x: self._base_client.request("GET", url, params=x), chunks)
+        return sum(parse_count(x) for x in counts)
+
+    async def exists(
+            self,
+            ids: Union[UUID, Iterable[UUID]] = None,
+            subscriber_ids: Union[str, Iterable[str]] = None,
+            statuses: Union[SubscriptionStatus, Iterable[SubscriptionStatus]] = None,
+            expiration_date_gt: datetime = None,
+            expiration_date_gte: datetime = None,
+            expiration_date_lt: datetime = None,
+            expiration_date_lte: datetime = None,
+    ) -> bool:
+        url = f"/subscription"
+        params = build_query_params(ids, subscriber_ids, statuses, expiration_date_gte, expiration_date_gt,
+                                    expiration_date_lte, expiration_date_lt, limit=1, fields=["id"])
+        chunks = split_query_params(params)
+        pages = await async_fan_out(lambda x: self._base_client.request("GET", url, params=x), chunks)
+        return any(len(x) > 0 for x in pages)
 
     async def get_current_subscription(self, subscriber_id: str) -> Optional[Subscription]:
+        if self._current_cache is None:
+            return await self._get_current_subscription(subscriber_id)
+        # Callers get their own copy, so mutating a returned subscription cannot corrupt the cache
+        load = lambda: self._get_current_subscription(subscriber_id)
+        sub = await self._current_cache.get_or_load(subscriber_id, load)
+        return deepcopy(sub)
+
+    async def _get_current_subscription(self, subscriber_id: str) -> Optional[Subscription]:
         url = f"/subscription/active-one/{subscriber_id}"
-        json_data = await self._base_client.request("GET", url)
-        if json_data:
-            return deserialize_subscription(json_data)
-        return None
+        json_data = await self._base_client.request("GET", url, route="/subscription/active-one/{subscriber_id}")
+        return self._deserialize(json_data) if json_data else None
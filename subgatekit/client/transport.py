@@ -0,0 +1,48 @@
+from typing import Optional
+
+import httpx
+
+
+class TransportConfig:
+    def __init__(
+            self,
+            max_connections: Optional[int] = 100,
+            max_keepalive_connections: Optional[int] = 20,
+            keepalive_expiry: Optional[float] = 5.0,
+            http2: bool = False,
+            connect_timeout: Optional[float] = 5.0,
+            read_timeout: Optional[float] = 5.0,
+            write_timeout: Optional[float] = 5.0,
+            pool_timeout: Optional[float] = 5.0,
+    ):
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.write_timeout = write_timeout
+        self.pool_timeout = pool_timeout
+
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(
+            connect=self.connect_timeout,
+            read=self.read_timeout,
+            write=self.write_timeout,
+            pool=self.pool_timeout,
+        )
+
+    def client_kwargs(self) -> dict:
+        # http2 needs the optional 'h2' package (pip install httpx[http2])
+        return {
+            "limits": self.limits(),
+            "timeout": self.timeout(),
+            "http2": self.http2,
+        }
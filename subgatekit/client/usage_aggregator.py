@@ -0,0 +1,261 @@
+import asyncio
+import atexit
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from subgatekit.client.retry import is_transient_error
+from subgatekit.client.services import build_idempotency_key
+from subgatekit.client.subscription_client import SyncSubscriptionClient, AsyncSubscriptionClient
+from subgatekit.utils import ID, Number
+
+logger = logging.getLogger(__name__)
+
+UsageBatch = tuple[ID, dict[str, Number], str]
+
+
+class _UsageBuffer:
+    def __init__(self, flush_interval: float, max_keys: int, max_concurrency: int):
+        self._flush_interval = flush_interval
+        self._max_keys = max_keys
+        self._max_concurrency = max_concurrency
+        self._pending: dict[ID, dict[str, Number]] = {}
+        self._failed: list[UsageBatch] = []
+        self._size = 0
+        self._failed_size = 0
+
+    @property
+    def pending_size(self) -> int:
+        return self._size + self._failed_size
+
+    def _try_add(self, sub_id: ID, code: str, delta: Number) -> bool:
+        deltas = self._pending.get(sub_id)
+        if deltas is not None and code in deltas:
+            deltas[code] += delta
+            return True
+        if self.pending_size >= self._max_keys:
+            return False
+        if deltas is None:
+            deltas = self._pending[sub_id] = {}
+        deltas[code] = delta
+        self._size += 1
+        return True
+
+    def _is_above_high_water(self) -> bool:
+        return self._size >= self._max_keys // 2
+
+    def _take(self) -> list[UsageBatch]:
+        batches = self._failed + [(x, deltas, build_idempotency_key(x)) for x, deltas in self._pending.items()]
+        self._pending, self._failed, self._size, self._failed_size = {}, [], 0, 0
+        return batches
+
+    @staticmethod
+    def _split(batch: UsageBatch) -> list[UsageBatch]:
+        sub_id, deltas, _ = batch
+        return [(sub_id, {code: delta}, build_idempotency_key(sub_id)) for code, delta in deltas.items()]
+
+    @staticmethod
+    def _needs_split(batch: UsageBatch, exc: Optional[Exception]) -> bool:
+        # One rejected code (e.g. unknown to the subscription) must not drop the valid deltas sent along with it
+        return exc is not None and not is_transient_error(exc) and len(batch[1]) > 1
+
+    def _warn_if_pending(self) -> None:
+        if self.pending_size:
+            logger.warning(f"The usage aggregator was closed with {self.pending_size} undelivered usage deltas")
+
+    def _handle_result(self, batch: UsageBatch, exc: Optional[Exception]) -> None:
+        if exc is None:
+            return
+        if is_transient_error(exc):
+            # The batch keeps its idempotency key, so a write that has actually landed is not counted twice
+            self._failed.append(batch)
+            self._failed_size += len(batch[1])
+        else:
+            logger.error(f"Dropped usage deltas {batch[1]} of the subscription '{batch[0]}': {exc}")
+
+
+class SyncUsageAggregator(_UsageBuffer):
+    def __init__(
+            self,
+            client: SyncSubscriptionClient,
+            flush_interval: float = 1.0,
+            max_keys: int = 10_000,
+            max_concurrency: int = 8,
+    ):
+        super().__init__(flush_interval, max_keys, max_concurrency)
+        self._client = client
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="subgate-usage-aggregator", daemon=True)
+        self._thread.start()
+        # The flusher is a daemon thread, so an interpreter exit would otherwise lose the buffer silently
+        atexit.register(self.close)
+
+    def add(self, sub_id: ID, code: str, delta: Number = 1) -> None:
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The usage aggregator is closed")
+            if self._try_add(sub_id, code, delta):
+                if self._is_above_high_water():
+                    self._wakeup.set()
+                return
+        self.flush()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The usage aggregator is closed")
+            if not self._try_add(sub_id, code, delta):
+                raise BufferError(f"The usage aggregator is full ({self._max_keys} pending keys)")
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            with self._lock:
+                batches = self._take()
+            if not batches:
+                return
+            try:
+                with ThreadPoolExecutor(max_workers=min(len(batches), self._max_concurrency)) as executor:
+                    results = list(executor.map(self._send, batches))
+            except RuntimeError:
+                # Executors refuse new work once the interpreter is shutting down, the atexit flush goes one by one
+                results = [self._send(x) for x in batches]
+            with self._lock:
+                for batch, exc in (x for result in results for x in result):
+                    self._handle_result(batch, exc)
+
+    def _send(self, batch: UsageBatch) -> list[tuple[UsageBatch, Optional[Exception]]]:
+        exc = self._send_one(batch)
+        if not self._needs_split(batch, exc):
+            return [(batch, exc)]
+        return [(x, self._send_one(x)) for x in self._split(batch)]
+
+    def _send_one(self, batch: UsageBatch) -> Optional[Exception]:
+        sub_id, deltas, key = batch
+        try:
+            self._client.increase_usages(sub_id, deltas, key)
+        except Exception as exc:
+            return exc
+        return None
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(self._flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Usage flush failed")
+            if self._closed:
+                return
+
+    def close(self) -> None:
+        atexit.unregister(self.close)
+        with self._lock:
+            self._closed = True
+        self._wakeup.set()
+        self._thread.join()
+        # Deltas added while the last flush was in flight are still pending; failed batches get one more try with them
+        while self._size:
+            self.flush()
+        self._warn_if_pending()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class AsyncUsageAggregator(_UsageBuffer):
+    def __init__(
+            self,
+            client: AsyncSubscriptionClient,
+            flush_interval: float = 1.0,
+            max_keys: int = 10_000,
+            max_concurrency: int = 8,
+    ):
+        super().__init__(flush_interval, max_keys, max_concurrency)
+        self._client = client
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+        # The event loop is gone at interpreter exit, so an unclosed async aggregator can only report what it loses
+        atexit.register(self._warn_if_pending)
+
+    async def add(self, sub_id: ID, code: str, delta: Number = 1) -> None:
+        if self._closed:
+            raise RuntimeError("The usage aggregator is closed")
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        if self._try_add(sub_id, code, delta):
+            if self._is_above_high_water():
+                self._wakeup.set()
+            return
+        await self.flush()
+        if self._closed:
+            raise RuntimeError("The usage aggregator is closed")
+        if not self._try_add(sub_id, code, delta):
+            raise BufferError(f"The usage aggregator is full ({self._max_keys} pending keys)")
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            batches = self._take()
+            if not batches:
+                return
+            semaphore = asyncio.Semaphore(self._max_concurrency)
+            results = await asyncio.gather(*(self._send(x, semaphore) for x in batches))
+            for batch, exc in (x for result in results for x in result):
+                self._handle_result(batch, exc)
+
+    async def _send(
+            self,
+            batch: UsageBatch,
+            semaphore: asyncio.Semaphore,
+    ) -> list[tuple[UsageBatch, Optional[Exception]]]:
+        exc = await self._send_one(batch, semaphore)
+        if not self._needs_split(batch, exc):
+            return [(batch, exc)]
+        return [(x, await self._send_one(x, semaphore)) for x in self._split(batch)]
+
+    async def _send_one(self, batch: UsageBatch, semaphore: asyncio.Semaphore) -> Optional[Exception]:
+        sub_id, deltas, key = batch
+        async with semaphore:
+            try:
+                await self._client.increase_usages(sub_id, deltas, key)
+            except Exception as exc:
+                return exc
+        return None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._flush_interval)
+            except TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Usage flush failed")
+            if self._closed:
+                return
+
+    async def close(self) -> None:
+        atexit.unregister(self._warn_if_pending)
+        self._closed = True
+        if self._task is not None:
+            self._wakeup.set()
+            await self._task
+        # Deltas added while the last flush was in flight are still pending; failed batches get one more try with them
+        while self._size:
+            await self.flush()
+        self._warn_if_pending()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
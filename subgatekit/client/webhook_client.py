@@ -1,6 +1,7 @@
 from subgatekit.client.base_client import SyncBaseClient, AsyncBaseClient
 from subgatekit.client.deserializers import deserialize_webhook
 from subgatekit.client.serailizers import serialize_webhook
+from subgatekit.client.services import build_idempotency_key
 from subgatekit.entities import Webhook
 from subgatekit.utils import ID
 
@@ -12,16 +13,18 @@ class SyncWebhookClient:
     def create(self, webhook: Webhook) -> None:
         url = "/webhook"
         data = serialize_webhook(webhook)
-        self._base_client.request("POST", url, json=data)
+        key = build_idempotency_key(webhook.id)
+        self._base_client.request("POST", url, json=data, idempotency_key=key)
 
     def update(self, webhook: Webhook) -> None:
         url = f"/webhook/{webhook.id}"
         data = serialize_webhook(webhook)
-        self._base_client.request("PUT", url, json=data)
+        key = build_idempotency_key(webhook.id)
+        self._base_client.request("PUT", url, json=data, idempotency_key=key, route="/webhook/{id}")
 
     def delete_by_id(self, webhook_id: ID) -> None:
         url = f"/webhook/{webhook_id}"
-        self._base_client.request("DELETE", url)
+        self._base_client.request("DELETE", url, route="/webhook/{id}")
 
     def delete_all(self):
         url = f"/webhook"
@@ -29,7 +32,7 @@ class SyncWebhookClient:
 
     def get_by_id(self, webhook_id: ID) -> Webhook:
         url = f"/webhook/{webhook_id}"
-        json_data = self._base_client.request("GET", url)
+        json_data = self._base_client.request("GET", url, route="/webhook/{id}")
         return deserialize_webhook(json_data)
 
     def get_all(self):
@@ -45,16 +48,18 @@ class AsyncWebhookClient:
     async def create(self, webhook: Webhook) -> None:
         url = "/webhook"
         data = serialize_webhook(webhook)
-        await self._base_client.request("POST", url, json=data)
+        key = build_idempotency_key(webhook.id)
+        await self._base_client.request("POST", url, json=data, idempotency_key=key)
 
     async def update(self, webhook: Webhook) -> None:
         url = f"/webhook/{webhook.id}"
         data = serialize_webhook(webhook)
-        await self._base_client.request("PUT", url, json=data)
+        key = build_idempotency_key(webhook.id)
+        await self._base_client.request("PUT", url, json=data, idempotency_key=key, route="/webhook/{id}")
 
     async def delete_by_id(self, webhook_id: ID) -> None:
         url = f"/webhook/{webhook_id}"
-        await self._base_client.request("DELETE", url)
+        await self._base_client.request("DELETE", url, route="/webhook/{id}")
 
     async def delete_all(self):
         url = f"/webhook"
@@ -62,7 +67,7 @@ class AsyncWebhookClient:
 
     async def get_by_id(self, webhook_id: ID) -> Webhook:
         url = f"/webhook/{webhook_id}"
-        json_data = await self._base_client.request("GET", url)
+        json_data = await self._base_client.request("GET", url, route="/webhook/{id}")
         return deserialize_webhook(json_data)
 
     async def get_all(self):
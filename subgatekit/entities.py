@@ -463,3 +463,29 @@ class Webhook:
     @property
     def updated_at(self) -> datetime:
         return self._updated_at
+
+
+class _PartialEntity:
+    _entity_name = "entity"
+
+    def __init__(self, id: ID, **fields: Any):
+        self.id = id
+        self.__dict__.update(fields)
+
+    @property
+    def loaded_fields(self) -> frozenset[str]:
+        return frozenset(self.__dict__)
+
+    def __getattr__(self, item: str) -> Any:
+        # Called only for attributes that are absent, i.e. sections that were not requested
+        if item.startswith("__"):
+            raise AttributeError(item)
+        raise AttributeError(f"The field '{item}' was not requested for the partial {self._entity_name}")
+
+
+class PartialSubscription(_PartialEntity):
+    _entity_name = "subscription"
+
+
+class PartialPlan(_PartialEntity):
+    _entity_name = "plan"
@@ -74,3 +74,12 @@ class ActiveStatusConflict(Exception):
 
     def __str__(self):
         return f"The subscriber with ID '{self.subscriber_id}' already has an active subscription."
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, key: str, retry_after: float):
+        self.key = key
+        self.retry_after = retry_after
+
+    def __str__(self):
+        return f"The circuit for '{self.key}' is open. Retry after {self.retry_after:.2f} seconds."
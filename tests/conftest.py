@@ -33,6 +33,12 @@ def sync_client():
     yield sclient
 
 
+@pytest.fixture(scope="session")
+def async_client():
+    aclient = AsyncSubgateClient(CLIENT_BASE_URL, CLIENT_APIKEY_ID, CLIENT_APIKEY_VALUE)
+    yield aclient
+
+
 @pytest.fixture(autouse=True, scope="function")
 def clear_all(sync_client):
     sync_client.plan_client().delete_selected()
@@ -0,0 +1,836 @@
+import asyncio
+import datetime
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from subgatekit import (SubgateClient, AsyncSubgateClient, TransportConfig, RetryPolicy, RetryBudget, CircuitState,
+                        CircuitBreakerPolicy, RateLimit, StdlibJsonCodec, OrjsonCodec, MsgspecCodec, Plan, Period,
+                        Subscription, UsageRate, SyncUsageAggregator, AsyncUsageAggregator, CachePolicy,
+                        CacheInvalidator)
+from subgatekit.client.circuit_breaker import CircuitBreaker
+from subgatekit.client.cache import TTLCache, MISSING, SyncLoadingCache, AsyncLoadingCache
+from subgatekit.client.change_tracking import build_change_set
+from subgatekit.client.serailizers import serialize_plan, serialize_subscription
+from subgatekit.client.revalidation import RevalidationCache
+from subgatekit.client.services import (build_query_params, split_query_params, processing_conditional_response,
+                                         build_conditional_headers, merge_pages, MAX_QUERY_LENGTH)
+from subgatekit.enums import SubscriptionStatus, EventCode
+from subgatekit.exceptions import ItemNotExist, ItemAlreadyExist, CircuitOpenError
+from tests.conftest import CLIENT_BASE_URL, CLIENT_APIKEY_ID, CLIENT_APIKEY_VALUE, wrapper
+from tests.fakes import simple_plan, simple_subscription, subscription_with_usages
+
+TRANSPORT = TransportConfig(max_connections=10, max_keepalive_connections=5, keepalive_expiry=30, read_timeout=10)
+
+
+def mock_client(client_cls, handler, **kwargs):
+    client = client_cls(CLIENT_BASE_URL, CLIENT_APIKEY_ID, CLIENT_APIKEY_VALUE, **kwargs)
+    http_cls = httpx.AsyncClient if client_cls is AsyncSubgateClient else httpx.Client
+    client.plan_client()._base_client._client = http_cls(transport=httpx.MockTransport(handler))
+    return client
+
+
+def plan_json(plan: Plan) -> dict:
+    created_at = plan.created_at.isoformat()
+    return {**serialize_plan(plan), "created_at": created_at, "updated_at": created_at}
+
+
+class TestTransportConfig:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("client_cls", [SubgateClient, AsyncSubgateClient])
+    async def test_client_with_custom_transport(self, client_cls):
+        client = client_cls(CLIENT_BASE_URL, CLIENT_APIKEY_ID, CLIENT_APIKEY_VALUE, transport=TRANSPORT)
+        plan = Plan("Personal", 100, "USD", Period.Monthly)
+        await wrapper(client.plan_client().create(plan))
+        real = await wrapper(client.plan_client().get_by_id(plan.id))
+        assert real.id == plan.id
+
+    def test_transport_limits_and_timeout(self):
+        limits = TRANSPORT.limits()
+        timeout = TRANSPORT.timeout()
+        assert limits.max_connections == 10
+        assert limits.keepalive_expiry == 30
+        assert timeout.read == 10
+        assert timeout.connect == 5.0
+
+
+class TestRetryPolicy:
+    @staticmethod
+    def status_error(status_code: int) -> httpx.HTTPStatusError:
+        request = httpx.Request("GET", CLIENT_BASE_URL)
+        response = httpx.Response(status_code, request=request)
+        return httpx.HTTPStatusError("Error", request=request, response=response)
+
+    def test_retryable_errors(self):
+        policy = RetryPolicy()
+        assert policy.should_retry("GET", 1, httpx.ConnectError("Error"))
+        assert policy.should_retry("GET", 1, httpx.ReadTimeout("Error"))
+        assert policy.should_retry("GET", 1, self.status_error(503))
+
+    def test_not_retryable_errors(self):
+        policy = RetryPolicy()
+        assert not policy.should_retry("GET", 1, self.status_error(500))
+        assert not policy.should_retry("GET", 1, ItemNotExist("Subscription", "AnyID", "id"))
+        assert not policy.should_retry("POST", 1, httpx.ConnectError("Error"))
+        assert not policy.should_retry("GET", 3, httpx.ConnectError("Error"))
+
+    def test_writes_with_idempotency_key_are_retryable(self):
+        policy = RetryPolicy()
+        assert policy.should_retry("POST", 1, httpx.ConnectError("Error"), idempotent=True)
+
+    def test_throttled_requests_are_retryable(self):
+        policy = RetryPolicy()
+        exc = self.status_error(429)
+        exc.response.headers["Retry-After"] = "7"
+        assert policy.should_retry("POST", 1, exc)
+        assert policy.backoff(1, exc) == 7
+
+    def test_retry_budget(self):
+        policy = RetryPolicy(budget=RetryBudget(ratio=0, min_retries_per_second=0, max_tokens=2))
+        assert policy.should_retry("GET", 1, httpx.ConnectError("Error"))
+        assert policy.should_retry("GET", 1, httpx.ConnectError("Error"))
+        assert not policy.should_retry("GET", 1, httpx.ConnectError("Error"))
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("client_cls", [SubgateClient, AsyncSubgateClient])
+    async def test_transient_error_is_retried(self, client_cls):
+        plan = Plan("Personal", 100, "USD", Period.Monthly)
+        responses = [httpx.Response(503), httpx.Response(200, json=plan_json(plan))]
+        client = mock_client(client_cls, lambda request: responses.pop(0), retry=RetryPolicy(backoff_base=0))
+        real = await wrapper(client.plan_client().get_by_id(plan.id))
+        assert real.id == plan.id
+        assert responses == []
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("client_cls", [SubgateClient, AsyncSubgateClient])
+    async def test_backoff_between_attempts(self, client_cls):
+        sent_at = []
+
+        def handler(request):
+            sent_at.append(time.monotonic())
+            raise httpx.ConnectError("Error")
+
+        client = mock_client(client_cls, handler, retry=RetryPolicy(backoff_base=0.05, jitter=False))
+        with pytest.raises(httpx.ConnectError):
+            await wrapper(client.plan_client().get_by_id(Plan("Personal", 100, "USD", Period.Monthly).id))
+        assert len(sent_at) == 3
+        assert sent_at[1] - sent_at[0] >= 0.05
+        assert sent_at[2] - sent_at[1] >= 0.1
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("client_cls", [SubgateClient, AsyncSubgateClient])
+    async def test_exhausted_budget_stops_retries(self, client_cls):
+        requests = []
+        budget = RetryBudget(ratio=0, min_retries_per_second=0, max_tokens=1)
+        client = mock_client(client_cls, lambda request: requests.append(request) or httpx.Response(503),
+                             retry=RetryPolicy(backoff_base=0, budget=budget))
+        plan_id = Plan("Personal", 100, "USD", Period.Monthly).id
+        with pytest.raises(httpx.HTTPStatusError):
+            await wrapper(client.plan_client().get_by_id(plan_id))
+        assert len(requests) == 2
+
+        # The only retry token is spent, so the next failure is final on the first attempt
+        with pytest.raises(httpx.HTTPStatusError):
+            await wrapper(client.plan_client().get_by_id(plan_id))
+        assert len(requests) == 3
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("client_cls", [SubgateClient, AsyncSubgateClient])
+    async def test_retried_write_that_has_landed(self, client_cls):
+        plan = Plan("Personal", 100, "USD", Period.Monthly)
+        conflict = {"exception_code": "item_already_exist", "item_type": "Plan", "index_value": str(plan.id),
+                    "index_key": "id"}
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            if len(requests) == 1:
+                raise httpx.ReadTimeout("Error")
+            return httpx.Response(409, json=conflict)
+
+        client = mock_client(client_cls, handler, retry=RetryPolicy(backoff_base=0))
+        await wrapper(client.plan_client().create(plan))
+        assert len(requests) == 2
+        assert requests[0].headers["Idempotency-Key"] == requests[1].headers["Idempotency-Key"]
+
+        # A conflict on the first attempt is a real duplicate
+        with pytest.raises(ItemAlreadyExist):
+            await wrapper(client.plan_client().create(plan))
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("client_cls", [SubgateClient, AsyncSubgateClient])
+    async def test_writes_carry_idempotency_keys(self, client_cls):
+        requests = []
+        client = mock_client(client_cls, lambda request: requests.append(request) or httpx.Response(204))
+        plan = Plan("Personal", 100, "USD", Period.Monthly)
+        await wrapper(client.plan_client().create(plan))
+        await wrapper(client.plan_client().update(plan))
+        keys = [x.headers["Idempotency-Key"] for x in requests]
+        assert all(x.startswith(f"{plan.id}:") for x in keys)
+        assert keys[0] != keys[1]
+
+
+class TestCircuitBreaker:
+    def test_open_after_failures(self):
+        policy = CircuitBreakerPolicy(failure_threshold=2, recovery_timeout=60)
+        breaker = policy.get("GET", "/subscription/active-one/{subscriber_id}")
+        for _ in range(2):
+            breaker.before_request()
+            breaker.record_failure()
+        assert policy.state("GET", "/subscription/active-one/{subscriber_id}") == CircuitState.Open
+        with pytest.raises(CircuitOpenError):
+            breaker.before_request()
+
+    def test_half_open_probe(self):
+        policy = CircuitBreakerPolicy(failure_threshold=1, recovery_timeout=0)
+        breaker = policy.get("GET", "/plan/{id}")
+        breaker.record_failure()
+        assert breaker.state == CircuitState.HalfOpen
+
+        breaker.before_request()
+        with pytest.raises(CircuitOpenError):
+            breaker.before_request()
+
+        breaker.record_success()
+        assert breaker.state == CircuitState.Closed
+
+    def test_transport_errors_are_failures(self):
+        for exc in (httpx.ConnectError("Error"), httpx.ReadError("Error"), httpx.WriteError("Error"),
+                    httpx.RemoteProtocolError("Error"), httpx.ReadTimeout("Error")):
+            assert CircuitBreaker.is_failure(exc)
+        assert CircuitBreaker.is_failure(TestRetryPolicy.status_error(503))
+        assert not CircuitBreaker.is_failure(TestRetryPolicy.status_error(429))
+        assert not CircuitBreaker.is_failure(ItemNotExist("Plan", "AnyID", "id"))
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("client_cls", [SubgateClient, AsyncSubgateClient])
+    async def test_unclassified_error_does_not_close_breaker(self, client_cls):
+        plan_id = Plan("Personal", 100, "USD", Period.Monthly).id
+        not_found = {"exception_code": "item_not_exist", "item_type": "Plan", "lookup_field_value": str(plan_id),
+                     "lookup_field_key": "id"}
+        responses = [httpx.ReadError("Error"), httpx.Response(404, json=not_found), httpx.RemoteProtocolError("Error")]
+
+        def handler(request):
+            response = responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        policy = CircuitBreakerPolicy(failure_threshold=2, recovery_timeout=60)
+        client = mock_client(client_cls, handler, circuit_breaker=policy)
+        for exc_type in (httpx.ReadError, ItemNotExist, httpx.RemoteProtocolError):
+            with pytest.raises(exc_type):
+                await wrapper(client.plan_client().get_by_id(plan_id))
+
+        # The 404 in between neither reset the failure count nor closed anything
+        assert policy.state("GET", "/plan/{id}") == CircuitState.Open
+
+    @pytest.mark.asyncio
+    async def test_cancelled_probe_is_released(self):
+        async def hang(request):
+            await asyncio.sleep(60)
+
+        policy = CircuitBreakerPolicy(failure_threshold=1, recovery_timeout=0)
+        breaker = policy.get("GET", "/plan/{id}")
+        breaker.record_failure()
+        client = AsyncSubgateClient(CLIENT_BASE_URL, CLIENT_APIKEY_ID, CLIENT_APIKEY_VALUE, circuit_breaker=policy)
+        client.plan_client()._base_client._client = httpx.AsyncClient(transport=httpx.MockTransport(hang))
+        plan = Plan("Personal", 100, "USD", Period.Monthly)
+        with pytest.raises(TimeoutError):
+            await asyncio.wait_for(client.plan_client().get_by_id(plan.id), 0.05)
+
+        # The cancelled probe does not keep the breaker half-open forever
+        breaker.before_request()
+        assert breaker.state == CircuitState.HalfOpen
+
+    def test_closed_stream_records_probe(self):
+        policy = CircuitBreakerPolicy(failure_threshold=1, recovery_timeout=0)
+        breaker = policy.get("GET", "/plan")
+        breaker.record_failure()
+        client = SubgateClient(CLIENT_BASE_URL, CLIENT_APIKEY_ID, CLIENT_APIKEY_VALUE, circuit_breaker=policy)
+        transport = httpx.MockTransport(lambda request: httpx.Response(200, json=[{}, {}]))
+        client.plan_client()._base_client._client = httpx.Client(transport=transport)
+        stream = client.plan_client()._base_client.stream("GET", "/plan")
+        next(stream)
+        stream.close()
+        assert breaker.state == CircuitState.Closed
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("client_cls", [SubgateClient, AsyncSubgateClient])
+    async def test_client_breaker_opens_and_recovers(self, client_cls):
+        plan = Plan("Personal", 100, "USD", Period.Monthly)
+        responses = [httpx.Response(503), httpx.Response(503), httpx.Response(200, json=plan_json(plan))]
+        policy = CircuitBreakerPolicy(failure_threshold=2, recovery_timeout=0.05)
+        client = mock_client(client_cls, lambda request: responses.pop(0), circuit_breaker=policy)
+        for _ in range(2):
+            with pytest.raises(httpx.HTTPStatusError):
+                await wrapper(client.plan_client().get_by_id(plan.id))
+        assert policy.state("GET", "/plan/{id}") == CircuitState.Open
+
+        # An open breaker fails fast without sending anything
+        with pytest.raises(CircuitOpenError):
+            await wrapper(client.plan_client().get_by_id(plan.id))
+        assert len(responses) == 1
+
+        time.sleep(0.05)
+        assert policy.state("GET", "/plan/{id}") == CircuitState.HalfOpen
+        real = await wrapper(client.plan_client().get_by_id(plan.id))
+        assert real.id == plan.id
+        assert policy.state("GET", "/plan/{id}") == CircuitState.Closed
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("client_cls", [SubgateClient, AsyncSubgateClient])
+    async def test_client_breaker_failed_probe_reopens(self, client_cls):
+        plan_id = Plan("Personal", 100, "USD", Period.Monthly).id
+        requests = []
+        policy = CircuitBreakerPolicy(failure_threshold=1, recovery_timeout=0.05)
+        client = mock_client(client_cls, lambda request: requests.append(request) or httpx.Response(503),
+                             circuit_breaker=policy)
+        with pytest.raises(httpx.HTTPStatusError):
+            await wrapper(client.plan_client().get_by_id(plan_id))
+        assert policy.state("GET", "/plan/{id}") == CircuitState.Open
+
+        time.sleep(0.05)
+        assert policy.state("GET", "/plan/{id}") == CircuitState.HalfOpen
+        with pytest.raises(httpx.HTTPStatusError):
+            await wrapper(client.plan_client().get_by_id(plan_id))
+        assert policy.state("GET", "/plan/{id}") == CircuitState.Open
+
+        # The cooldown starts over after the failed probe
+        with pytest.raises(CircuitOpenError):
+            await wrapper(client.plan_client().get_by_id(plan_id))
+        assert len(requests) == 2
+
+
+class TestRateLimit:
+    def test_burst_then_throttle(self):
+        rate_limit = RateLimit(rate=10, burst=2)
+        assert rate_limit.reserve("/subscription") == 0
+        assert rate_limit.reserve("/subscription") == 0
+        assert rate_limit.reserve("/subscription") == pytest.approx(0.1, abs=0.01)
+
+    def test_per_route_buckets(self):
+        rate_limit = RateLimit(rate=10, burst=1, per_route=True)
+        assert rate_limit.reserve("/subscription") == 0
+        assert rate_limit.reserve("/plan") == 0
+
+    def test_block_on_retry_after(self):
+        rate_limit = RateLimit(rate=10, burst=10)
+        rate_limit.block("/subscription", 5)
+        assert rate_limit.reserve("/subscription") == pytest.approx(5, abs=0.1)
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("client_cls", [SubgateClient, AsyncSubgateClient])
+    async def test_client_spaces_requests(self, client_cls):
+        sent_at = []
+
+        def handler(request):
+            sent_at.append(time.monotonic())
+            return httpx.Response(200, json=[])
+
+        client = mock_client(client_cls, handler, rate_limit=RateLimit(rate=20, burst=1))
+        for _ in range(3):
+            await wrapper(client.plan_client().get_selected())
+        assert sent_at[1] - sent_at[0] >= 0.045
+        assert sent_at[2] - sent_at[1] >= 0.045
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("client_cls", [SubgateClient, AsyncSubgateClient])
+    async def test_client_blocks_route_on_retry_after(self, client_cls):
+        sent_at = []
+
+        def handler(request):
+            sent_at.append(time.monotonic())
+            if len(sent_at) == 1:
+                return httpx.Response(429, headers={"Retry-After": "0.2"})
+            return httpx.Response(200, json=[])
+
+        client = mock_client(client_cls, handler, rate_limit=RateLimit(rate=100, burst=100))
+        with pytest.raises(httpx.HTTPStatusError):
+            await wrapper(client.plan_client().get_selected())
+        await wrapper(client.plan_client().get_selected())
+        assert sent_at[1] - sent_at[0] >= 0.19
+
+
+class TestSingleFlight:
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_are_coalesced(self):
+        client = AsyncSubgateClient(CLIENT_BASE_URL, CLIENT_APIKEY_ID, CLIENT_APIKEY_VALUE, single_flight=True)
+        results = await asyncio.gather(
+            *[client.subscription_client().get_current_subscription("AnyID") for _ in range(10)]
+        )
+        assert results == [None] * 10
+
+    @pytest.mark.asyncio
+    async def test_coalesced_results_are_independent(self, simple_plan):
+        client = AsyncSubgateClient(CLIENT_BASE_URL, CLIENT_APIKEY_ID, CLIENT_APIKEY_VALUE, single_flight=True)
+        first, second = await asyncio.gather(
+            client.plan_client().get_by_id(simple_plan.id),
+            client.plan_client().get_by_id(simple_plan.id),
+        )
+        assert first.id == second.id == simple_plan.id
+        assert first.fields is not second.fields
+
+
+class TestBatchLoader:
+    @pytest.mark.asyncio
+    async def test_get_by_id_calls_are_batched(self, simple_plan):
+        client = AsyncSubgateClient(CLIENT_BASE_URL, CLIENT_APIKEY_ID, CLIENT_APIKEY_VALUE, batch_window=0)
+        subs = [Subscription.from_plan(simple_plan, f"Subscriber{i}") for i in range(5)]
+        for sub in subs:
+            await client.subscription_client().create(sub)
+
+        real = await asyncio.gather(*[client.subscription_client().get_by_id(sub.id) for sub in subs])
+        assert [x.id for x in real] == [x.id for x in subs]
+
+    @pytest.mark.asyncio
+    async def test_batched_get_by_id_raises_item_not_exist(self, simple_subscription):
+        client = AsyncSubgateClient(CLIENT_BASE_URL, CLIENT_APIKEY_ID, CLIENT_APIKEY_VALUE, batch_window=0.005)
+        missing = Plan("Personal", 100, "USD", Period.Monthly).id
+        real, error = await asyncio.gather(
+            client.subscription_client().get_by_id(simple_subscription.id),
+            client.subscription_client().get_by_id(missing),
+            return_exceptions=True,
+        )
+        assert real.id == simple_subscription.id
+        assert isinstance(error, ItemNotExist)
+
+    @pytest.mark.asyncio
+    async def test_full_batch_is_split_by_query_length(self):
+        urls = []
+
+        def handler(request):
+            urls.append(str(request.url))
+            return httpx.Response(200, json=[])
+
+        client = AsyncSubgateClient(CLIENT_BASE_URL, CLIENT_APIKEY_ID, CLIENT_APIKEY_VALUE, batch_window=0)
+        client.plan_client()._base_client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        ids = [Plan("Personal", 100, "USD", Period.Monthly).id for _ in range(100)]
+        errors = await asyncio.gather(*[client.plan_client().get_by_id(x) for x in ids], return_exceptions=True)
+        assert all(isinstance(x, ItemNotExist) for x in errors)
+        assert len(urls) == 2
+        assert all(len(httpx.URL(x).query) <= MAX_QUERY_LENGTH for x in urls)
+
+
+CODECS = [("json", StdlibJsonCodec), ("orjson", OrjsonCodec), ("msgspec", MsgspecCodec)]
+
+
+class TestJsonCodec:
+    @pytest.mark.parametrize("module, codec_cls", CODECS)
+    def test_codec_round_trip(self, module, codec_cls):
+        pytest.importorskip(module)
+        codec = codec_cls()
+        data = serialize_plan(Plan("Personal", 100, "USD", Period.Monthly, fields={"Hello": "World!"}))
+        content = codec.encode(data)
+        assert isinstance(content, bytes)
+        assert codec.decode(content) == data
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("module, codec_cls", CODECS)
+    @pytest.mark.parametrize("client_cls", [SubgateClient, AsyncSubgateClient])
+    async def test_client_with_codec(self, client_cls, module, codec_cls):
+        pytest.importorskip(module)
+        now = datetime.datetime.now(datetime.UTC).isoformat()
+        stored = {}
+
+        def handler(request):
+            if request.method == "POST":
+                data = json.loads(request.content)
+                stored[data["id"]] = {**data, "created_at": now, "updated_at": now}
+                return httpx.Response(201, json="ok")
+            return httpx.Response(200, json=stored[request.url.path.rsplit("/", 1)[-1]])
+
+        client = mock_client(client_cls, handler, codec=codec_cls())
+        fields = {"Hello": "Мир!", "nested": {"x": [1, 2.5, None]}}
+        plan = Plan("Personal", 100.5, "USD", Period.Monthly, fields=fields)
+        plan.usage_rates.add(UsageRate("API calls", "api_call", "call", 1000, Period.Monthly))
+        await wrapper(client.plan_client().create(plan))
+        real = await wrapper(client.plan_client().get_by_id(plan.id))
+        assert serialize_plan(real) == serialize_plan(plan)
+
+
+class TestChunkedFilters:
+    def test_split_query_params(self):
+        ids = [f"{x:036d}" for x in range(300)]
+        params = build_query_params(ids=ids, statuses="active", skip=10, limit=20, fields=["title"])
+        chunks = split_query_params(params, max_length=1000)
+        assert len(chunks) == 14
+        assert all(len(str(httpx.QueryParams(chunk))) <= 1000 for chunk in chunks)
+        assert [x for chunk in chunks for x in chunk["ids"]] == ids
+        assert all(chunk["skip"] == 0 and chunk["limit"] == 30 for chunk in chunks)
+        assert all(chunk["statuses"] == ["active"] and "created_at" in chunk["fields"] for chunk in chunks)
+        assert split_query_params(build_query_params(ids=ids[:10])) == [build_query_params(ids=ids[:10])]
+
+    def test_every_query_fits_the_budget(self):
+        ids = [f"{x:036d}" for x in range(300)]
+        subscriber_ids = [f"Subscriber{x}" for x in range(20)]
+        params = build_query_params(ids=ids, subscriber_ids=subscriber_ids, statuses="active", fields=["title"])
+        chunks = split_query_params(params)
+        assert all(len(str(httpx.QueryParams(chunk))) <= MAX_QUERY_LENGTH for chunk in chunks)
+
+        # The short list rides along whole, so the long one is only cut as often as the query length demands
+        assert len(chunks) == 4
+        assert all(chunk["subscriber_ids"] == subscriber_ids for chunk in chunks)
+        assert [x for chunk in chunks for x in chunk["ids"]] == ids
+
+        # When neither list fits whole, every id still meets every subscriber id in exactly one query
+        subscriber_ids = [f"Subscriber{x}" for x in range(200)]
+        params = build_query_params(ids=ids, subscriber_ids=subscriber_ids)
+        chunks = split_query_params(params)
+        assert all(len(str(httpx.QueryParams(chunk))) <= MAX_QUERY_LENGTH for chunk in chunks)
+        pairs = [(x, y) for chunk in chunks for x in chunk["ids"] for y in chunk["subscriber_ids"]]
+        assert sorted(pairs) == sorted((x, y) for x in ids for y in subscriber_ids)
+
+    def test_merge_pages_with_nullable_column(self):
+        subs = [SimpleNamespace(paused_from=x) for x in (2, None, 1)]
+        params = {"order_by": ["paused_from,1"]}
+        assert [x.paused_from for x in merge_pages([subs[:1], subs[1:]], params)] == [None, 1, 2]
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("client_cls", [SubgateClient, AsyncSubgateClient])
+    async def test_get_selected_with_huge_ids_filter(self, client_cls):
+        client = client_cls(CLIENT_BASE_URL, CLIENT_APIKEY_ID, CLIENT_APIKEY_VALUE)
+        plans = [Plan(f"Plan {i}", 100, "USD", Period.Monthly) for i in range(250)]
+        for plan in plans:
+            await wrapper(client.plan_client().create(plan))
+        real = await wrapper(client.plan_client().get_selected(ids=[x.id for x in plans], limit=300))
+        assert {x.id for x in real} == {x.id for x in plans}
+        assert [x.created_at for x in real] == sorted(x.created_at for x in real)
+        assert await wrapper(client.plan_client().count_selected(ids=[x.id for x in plans])) == 250
+        assert await wrapper(client.plan_client().exists(ids=[x.id for x in plans]))
+
+        await wrapper(client.plan_client().delete_selected(ids=[x.id for x in plans]))
+        assert await wrapper(client.plan_client().count_selected()) == 0
+
+
+class TestPartialUpdates:
+    def test_build_change_set(self):
+        plan = Plan("Personal", 100, "USD", Period.Monthly, fields={"Hello": {"World": 1}})
+        plan.usage_rates.add(UsageRate("First", "first", "GB", 100, Period.Lifetime))
+        plan.usage_rates.add(UsageRate("Second", "second", "GB", 100, Period.Lifetime))
+        sub = Subscription.from_plan(plan, "AnyID", fields={"Hello": {"World": 1}})
+        original = serialize_subscription(sub)
+        original["fields"] = {"Hello": {"World": 1}}
+
+        sub.usages.get("first").increase(10)
+        sub.usages.remove("second")
+        sub.fields["Hello"]["World"] = 2
+        changes = build_change_set(original, serialize_subscription(sub))
+        assert changes == {"usages": serialize_subscription(sub)["usages"], "fields": {"Hello": {"World": 2}}}
+        assert build_change_set(original, original) == {}
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("client_cls", [SubgateClient, AsyncSubgateClient])
+    async def test_update_sends_only_changes(self, client_cls):
+        client = client_cls(CLIENT_BASE_URL, CLIENT_APIKEY_ID, CLIENT_APIKEY_VALUE, partial_updates=True)
+        plan = Plan("Personal", 100, "USD", Period.Monthly)
+        plan.usage_rates.add(UsageRate("First", "first", "GB", 100, Period.Lifetime))
+        sub = await wrapper(client.subscription_client().create_then_get(Subscription.from_plan(plan, "AnyID")))
+
+        sub.usages.get("first").increase(10)
+        sub.fields["Hello"] = "World!"
+        await wrapper(client.subscription_client().update(sub))
+        real = await wrapper(client.subscription_client().get_by_id(sub.id))
+        assert real.usages.get("first").used_units == 10
+        assert real.fields == {"Hello": "World!"}
+
+
+class TestSkipUnchanged:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("client_cls", [SubgateClient, AsyncSubgateClient])
+    async def test_unchanged_updates_are_skipped(self, client_cls):
+        client = client_cls(CLIENT_BASE_URL, CLIENT_APIKEY_ID, CLIENT_APIKEY_VALUE, skip_unchanged=True)
+        plan = Plan("Personal", 100, "USD", Period.Monthly)
+        subs = [Subscription.from_plan(plan, f"Subscriber {i}") for i in range(3)]
+        await wrapper(client.subscription_client().create_many(subs))
+        real = await wrapper(client.subscription_client().get_selected())
+
+        real[0].pause()
+        await wrapper(client.subscription_client().update_many(real))
+        stats = client.subscription_client().update_stats
+        assert (stats.sent, stats.skipped) == (1, 2)
+
+        # A successful update makes the sent state the new baseline
+        await wrapper(client.subscription_client().update(real[0]))
+        assert (stats.sent, stats.skipped) == (1, 3)
+
+
+class TestUsageAggregator:
+    def test_sync_aggregator(self, sync_client, subscription_with_usages):
+        with SyncUsageAggregator(sync_client.subscription_client(), flush_interval=0.1) as aggregator:
+            for _ in range(100):
+                aggregator.add(subscription_with_usages.id, "api_call")
+        real = sync_client.subscription_client().get_by_id(subscription_with_usages.id)
+        assert real.usages.get("api_call").used_units == 100
+
+    @pytest.mark.asyncio
+    async def test_async_aggregator(self, async_client, subscription_with_usages):
+        async with AsyncUsageAggregator(async_client.subscription_client(), max_keys=2) as aggregator:
+            for _ in range(100):
+                await aggregator.add(subscription_with_usages.id, "api_call", 2)
+        real = await async_client.subscription_client().get_by_id(subscription_with_usages.id)
+        assert real.usages.get("api_call").used_units == 200
+
+    def test_rejected_code_keeps_other_deltas(self):
+        sent = []
+
+        class Client:
+            def increase_usages(self, sub_id, deltas, key):
+                if "unknown" in deltas:
+                    raise ItemNotExist("Usage", "unknown", "code")
+                sent.append(deltas)
+
+        with SyncUsageAggregator(Client(), flush_interval=60) as aggregator:
+            aggregator.add("AnyID", "api_call", 3)
+            aggregator.add("AnyID", "unknown")
+        assert sent == [{"api_call": 3}]
+
+
+    def test_close_delivers_deltas_added_during_flush(self):
+        sent = []
+        flushing = threading.Event()
+
+        class Client:
+            def increase_usages(self, sub_id, deltas, key):
+                flushing.set()
+                time.sleep(0.1)
+                sent.append(deltas)
+
+        aggregator = SyncUsageAggregator(Client(), flush_interval=0.01)
+        aggregator.add("AnyID", "api_call")
+        flushing.wait()
+        aggregator.add("AnyID", "api_call", 5)
+        aggregator.close()
+        assert sum(x["api_call"] for x in sent) == 6
+
+    @pytest.mark.asyncio
+    async def test_async_close_delivers_deltas_added_during_flush(self):
+        sent = []
+        flushing = asyncio.Event()
+
+        class Client:
+            async def increase_usages(self, sub_id, deltas, key):
+                flushing.set()
+                await asyncio.sleep(0.1)
+                sent.append(deltas)
+
+        aggregator = AsyncUsageAggregator(Client(), flush_interval=0.01)
+        await aggregator.add("AnyID", "api_call")
+        await flushing.wait()
+        await aggregator.add("AnyID", "api_call", 5)
+        await aggregator.close()
+        assert sum(x["api_call"] for x in sent) == 6
+
+
+class TestWriteSpool:
+    def test_spooled_writes_survive_restart(self, tmp_path, sync_client, subscription_with_usages):
+        path = str(tmp_path / "spool.db")
+        offline = SubgateClient("http://localhost:1", CLIENT_APIKEY_ID, CLIENT_APIKEY_VALUE)
+        with offline.write_spool(path, drain_interval=0.05) as spool:
+            spool.increase_usage(subscription_with_usages.id, "api_call", 10)
+            subscription_with_usages.pause()
+            spool.update_subscription(subscription_with_usages)
+            assert spool.pending_count() == 2
+
+        with sync_client.write_spool(path) as spool:
+            spool.drain()
+            assert spool.pending_count() == 0
+        real = sync_client.subscription_client().get_by_id(subscription_with_usages.id)
+        assert real.status == SubscriptionStatus.Paused
+
+    @pytest.mark.asyncio
+    async def test_async_spool(self, tmp_path, async_client, subscription_with_usages):
+        async with async_client.write_spool(str(tmp_path / "spool.db")) as spool:
+            await spool.increase_usages(subscription_with_usages.id, {"api_call": 10})
+        real = await async_client.subscription_client().get_by_id(subscription_with_usages.id)
+        assert real.usages.get("api_call").used_units == 10
+
+
+class TestCurrentSubscriptionCache:
+    def test_ttl_cache(self):
+        cache = TTLCache(max_size=2, ttl=60)
+        cache.set("first", None)
+        cache.set("second", 2)
+        assert cache.get("first") is None
+        cache.set("expired", 3, ttl=0)
+        assert cache.get("second") is MISSING
+        assert cache.get("expired") is MISSING
+        assert cache.get("first") is None
+        assert (cache.stats.hits, cache.stats.misses, cache.stats.evictions) == (2, 2, 1)
+
+    def test_stale_while_revalidate(self):
+        cache = SyncLoadingCache(CachePolicy(ttl=0, stale_while_revalidate=60))
+        loads = []
+        load = lambda: loads.append(1) or len(loads)
+        assert cache.get_or_load("key", load) == 1
+        assert cache.get_or_load("key", load) == 1
+        cache._executor.shutdown()
+        assert cache.lookup("key")[0] == 2
+
+    def test_invalidation_keeps_loads_of_other_keys(self):
+        cache = SyncLoadingCache(CachePolicy(ttl=60))
+
+        def load():
+            cache.delete("other")
+            return 1
+
+        cache.get_or_load("key", load)
+        assert cache.get("key") == 1
+
+    @pytest.mark.asyncio
+    async def test_stale_if_error(self):
+        cache = AsyncLoadingCache(CachePolicy(ttl=0, stale_if_error=60))
+
+        async def load():
+            raise httpx.ConnectError("Error")
+
+        async def load_value():
+            return 1
+
+        assert await cache.get_or_load("key", load_value) == 1
+        assert await cache.get_or_load("key", load) == 1
+        cache.clear()
+        with pytest.raises(httpx.ConnectError):
+            await cache.get_or_load("key", load)
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("client_cls", [SubgateClient, AsyncSubgateClient])
+    async def test_cached_current_subscription(self, client_cls):
+        client = client_cls(CLIENT_BASE_URL, CLIENT_APIKEY_ID, CLIENT_APIKEY_VALUE, cache=CachePolicy(ttl=60))
+        sub_client = client.subscription_client()
+        assert await wrapper(sub_client.get_current_subscription("AnyID")) is None
+        assert await wrapper(sub_client.get_current_subscription("AnyID")) is None
+
+        # Creating through the same client invalidates the cached "no active subscription" result
+        sub = Subscription.from_plan(Plan("Personal", 100, "USD", Period.Monthly), "AnyID")
+        await wrapper(sub_client.create(sub))
+        real = await wrapper(sub_client.get_current_subscription("AnyID"))
+        assert real.id == sub.id
+
+        real.pause()
+        cached = await wrapper(sub_client.get_current_subscription("AnyID"))
+        assert cached.status == SubscriptionStatus.Active
+        assert (sub_client.cache_stats.hits, sub_client.cache_stats.misses) == (2, 2)
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("client_cls", [SubgateClient, AsyncSubgateClient])
+    async def test_negative_cache(self, client_cls):
+        client = client_cls(CLIENT_BASE_URL, CLIENT_APIKEY_ID, CLIENT_APIKEY_VALUE, cache=CachePolicy(negative_ttl=60))
+        plan_client = client.plan_client()
+        plan = Plan("Personal", 100, "USD", Period.Monthly)
+        for _ in range(2):
+            with pytest.raises(ItemNotExist):
+                await wrapper(plan_client.get_by_id(plan.id))
+
+        # Creating through the same client drops the cached miss right away
+        await wrapper(plan_client.create(plan))
+        real = await wrapper(plan_client.get_by_id(plan.id))
+        assert real.id == plan.id
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("client_cls", [SubgateClient, AsyncSubgateClient])
+    async def test_webhook_invalidation(self, client_cls, sync_client):
+        client = client_cls(CLIENT_BASE_URL, CLIENT_APIKEY_ID, CLIENT_APIKEY_VALUE, cache=CachePolicy(ttl=3600))
+        invalidator = CacheInvalidator(client)
+        assert await wrapper(client.subscription_client().get_current_subscription("AnyID")) is None
+
+        # Another service creates the subscription, the cached miss goes away with the webhook event
+        sub = Subscription.from_plan(Plan("Personal", 100, "USD", Period.Monthly), "AnyID")
+        sync_client.subscription_client().create(sub)
+        event = {"type": "event", "event_code": EventCode.SubCreated, "payload": serialize_subscription(sub)}
+        assert invalidator.handle(event)
+        real = await wrapper(client.subscription_client().get_current_subscription("AnyID"))
+        assert real.id == sub.id
+
+
+class TestConditionalRequests:
+    def test_conditional_response(self):
+        request = httpx.Request("GET", CLIENT_BASE_URL)
+        assert build_conditional_headers('"v1"', None) == {"If-None-Match": '"v1"'}
+
+        response = httpx.Response(200, json=[], headers={"ETag": '"v1"'}, request=request)
+        result = processing_conditional_response(response)
+        assert (result.data, result.etag, result.not_modified) == ([], '"v1"', False)
+
+        response = httpx.Response(304, headers={"ETag": '"v1"'}, request=request)
+        assert processing_conditional_response(response).not_modified
+
+    def test_not_modified_returns_a_copy(self):
+        request = httpx.Request("GET", CLIENT_BASE_URL)
+        cache = RevalidationCache()
+        response = processing_conditional_response(httpx.Response(200, json=[1], headers={"ETag": '"v1"'},
+                                                                   request=request))
+        value = cache.resolve("/plan", None, response, list)
+        entry = cache.lookup("/plan")
+        assert entry.validators() == {"etag": '"v1"', "last_modified": None}
+
+        value.clear()
+        response = processing_conditional_response(httpx.Response(304, request=request))
+        assert cache.resolve("/plan", entry, response, list) == [1]
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("client_cls", [SubgateClient, AsyncSubgateClient])
+    async def test_not_modified_plans_are_rebuilt(self, client_cls):
+        plans = [Plan(f"Plan {i}", 100, "USD", Period.Monthly, fields={"Hello": {"World": i}}) for i in range(3)]
+
+        def handler(request):
+            if request.headers.get("If-None-Match") == '"v1"':
+                return httpx.Response(304, headers={"ETag": '"v1"'})
+            return httpx.Response(200, json=[plan_json(x) for x in plans], headers={"ETag": '"v1"'})
+
+        client = mock_client(client_cls, handler, cache=CachePolicy(revalidate=True))
+        first = await wrapper(client.plan_client().get_selected())
+        first[0].fields["Hello"]["World"] = 100
+        second = await wrapper(client.plan_client().get_selected())
+        second[1].fields.clear()
+        third = await wrapper(client.plan_client().get_selected())
+        assert [x.fields for x in third] == [x.fields for x in plans]
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("client_cls", [SubgateClient, AsyncSubgateClient])
+    async def test_writes_drop_stale_plans(self, client_cls):
+        plan = Plan("Old", 100, "USD", Period.Monthly)
+        server = {"plan": plan_json(plan), "down": False}
+
+        def handler(request):
+            if server["down"]:
+                raise httpx.ConnectError("Error")
+            if request.method == "GET":
+                return httpx.Response(200, json=server["plan"], headers={"ETag": '"v1"'})
+            return httpx.Response(204)
+
+        client = mock_client(client_cls, handler, cache=CachePolicy(revalidate=True, stale_if_error=60))
+        plan_client = client.plan_client()
+        real = await wrapper(plan_client.get_by_id(plan.id))
+        real.title = "New"
+        await wrapper(plan_client.update(real))
+
+        # The cached response predates the update, so it must not be served while the server is down
+        server["down"] = True
+        with pytest.raises(httpx.ConnectError):
+            await wrapper(plan_client.get_by_id(plan.id))
+
+        server["down"] = False
+        await wrapper(plan_client.get_by_id(plan.id))
+        await wrapper(plan_client.delete_selected(ids=[plan.id]))
+        server["down"] = True
+        with pytest.raises(httpx.ConnectError):
+            await wrapper(plan_client.get_by_id(plan.id))
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("client_cls", [SubgateClient, AsyncSubgateClient])
+    async def test_revalidated_plans(self, client_cls):
+        client = client_cls(CLIENT_BASE_URL, CLIENT_APIKEY_ID, CLIENT_APIKEY_VALUE, cache=CachePolicy(revalidate=True))
+        plan_client = client.plan_client()
+        plan = Plan("Personal", 100, "USD", Period.Monthly)
+        await wrapper(plan_client.create(plan))
+        assert await wrapper(plan_client.get_selected()) == await wrapper(plan_client.get_selected())
+
+        real = await wrapper(plan_client.get_by_id(plan.id))
+        real.price = 200
+        await wrapper(plan_client.update(real))
+        assert (await wrapper(plan_client.get_by_id(plan.id))).price == 200
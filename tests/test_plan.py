@@ -63,6 +63,24 @@ class TestGetPlan:
         real = await wrapper(client.plan_client().get_selected(ids=[simple_plan.id, plan_with_rates.id]))
         assert len(real) == 2
 
+    def test_iter_selected_plans(self, sync_client, simple_plan, plan_with_rates, plan_with_fields):
+        real = list(sync_client.plan_client().iter_selected(page_size=2))
+        assert {x.id for x in real} == {simple_plan.id, plan_with_rates.id, plan_with_fields.id}
+
+    @pytest.mark.asyncio
+    async def test_aiter_selected_plans(self, async_client, simple_plan, plan_with_rates, plan_with_fields):
+        real = [x async for x in async_client.plan_client().aiter_selected(page_size=2)]
+        assert {x.id for x in real} == {simple_plan.id, plan_with_rates.id, plan_with_fields.id}
+
+    def test_stream_selected_plans(self, sync_client, simple_plan, plan_with_rates, plan_with_fields):
+        real = list(sync_client.plan_client().stream_selected())
+        assert {x.id for x in real} == {simple_plan.id, plan_with_rates.id, plan_with_fields.id}
+
+    @pytest.mark.asyncio
+    async def test_astream_selected_plans(self, async_client, simple_plan, plan_with_rates, plan_with_fields):
+        real = [x async for x in async_client.plan_client().astream_selected()]
+        assert {x.id for x in real} == {simple_plan.id, plan_with_rates.id, plan_with_fields.id}
+
 
 class TestUpdatePlan:
     @pytest.mark.asyncio
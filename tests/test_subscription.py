@@ -4,7 +4,7 @@ import pytest
 
 from subgatekit.entities import Plan, Subscription, Discount, Usage, UsageRate
 from subgatekit.enums import Period, SubscriptionStatus
-from subgatekit.exceptions import ActiveStatusConflict, ItemNotExist
+from subgatekit.exceptions import ActiveStatusConflict, ItemNotExist, ItemAlreadyExist
 from subgatekit.utils import get_current_datetime
 from tests.conftest import client, wrapper
 from tests.fakes import (simple_subscription, subscription_with_usages, subscription_with_discounts,
@@ -42,6 +42,17 @@ class TestCreateSubscription:
         real = await wrapper(client.subscription_client().create_then_get(sub))
         assert real.fields == {"Hello": "World!"}
 
+    @pytest.mark.asyncio
+    async def test_create_many(self, client):
+        plan = Plan("Personal", 100, "USD", Period.Monthly)
+        subs = [Subscription.from_plan(plan, f"Subscriber {i}") for i in range(20)]
+        result = await wrapper(client.subscription_client().create_many(subs, max_concurrency=4))
+        assert len(result.succeeded) == 20
+
+        result = await wrapper(client.subscription_client().create_many(subs[:3]))
+        assert [x.item_id for x in result.failed] == [x.id for x in subs[:3]]
+        assert all(isinstance(x.error, ItemAlreadyExist) for x in result)
+
 
 class TestGetSubscription:
     @pytest.mark.asyncio
@@ -67,6 +78,23 @@ class TestGetSubscription:
         assert real.id == subscription_with_fields.id
         assert real.fields == {"Hello": "World!"}
 
+    @pytest.mark.asyncio
+    async def test_get_one_with_projection(self, client, subscription_with_usages):
+        real = await wrapper(client.subscription_client().get_by_id(subscription_with_usages.id,
+                                                                    fields=["status", "plan_info"]))
+        assert real.id == subscription_with_usages.id
+        assert real.status == SubscriptionStatus.Active
+        assert real.plan_info.level == subscription_with_usages.plan_info.level
+        assert real.loaded_fields == {"id", "status", "plan_info"}
+
+    @pytest.mark.asyncio
+    async def test_get_selected_with_projection(self, client, simple_subscription):
+        real = await wrapper(client.subscription_client().get_selected(fields=["billing_info"]))
+        assert len(real) == 1
+        assert real[0].billing_info.next_billing_date == simple_subscription.billing_info.next_billing_date
+        with pytest.raises(AttributeError):
+            _ = real[0].usages
+
     @pytest.mark.asyncio
     async def test_get_current_subscription(self, client, simple_subscription):
         real = await wrapper(client.subscription_client().get_current_subscription(simple_subscription.subscriber_id))
@@ -82,6 +110,44 @@ class TestGetSubscription:
         real = await wrapper(client.subscription_client().get_selected())
         assert len(real) == 2
 
+    def test_iter_selected_subscriptions(self, sync_client, simple_subscription, subscription_with_usages):
+        real = list(sync_client.subscription_client().iter_selected(page_size=1))
+        assert {x.id for x in real} == {simple_subscription.id, subscription_with_usages.id}
+
+    @pytest.mark.asyncio
+    async def test_aiter_selected_subscriptions(self, async_client, simple_subscription, subscription_with_usages):
+        real = [x async for x in async_client.subscription_client().aiter_selected(page_size=1)]
+        assert {x.id for x in real} == {simple_subscription.id, subscription_with_usages.id}
+
+    def test_stream_selected_subscriptions(self, sync_client, simple_subscription, subscription_with_usages):
+        real = list(sync_client.subscription_client().stream_selected())
+        assert {x.id for x in real} == {simple_subscription.id, subscription_with_usages.id}
+
+    @pytest.mark.asyncio
+    async def test_astream_selected_subscriptions(self, async_client, simple_subscription, subscription_with_usages):
+        real = [x async for x in async_client.subscription_client().astream_selected()]
+        assert {x.id for x in real} == {simple_subscription.id, subscription_with_usages.id}
+
+    def test_iter_selected_subscriptions_with_keyset(self, sync_client, simple_subscription, subscription_with_usages):
+        expected = sorted([simple_subscription, subscription_with_usages], key=lambda x: (x.created_at, str(x.id)))
+        real = list(sync_client.subscription_client().iter_selected(page_size=1, keyset=True))
+        assert [x.id for x in real] == [x.id for x in expected]
+
+
+class TestCountSubscriptions:
+    @pytest.mark.asyncio
+    async def test_count_selected(self, client, simple_subscription, paused_subscription):
+        total = await wrapper(client.subscription_client().count_selected())
+        paused = await wrapper(client.subscription_client().count_selected(statuses=SubscriptionStatus.Paused))
+        assert total == 2
+        assert paused == 1
+
+    @pytest.mark.asyncio
+    async def test_exists(self, client, simple_subscription):
+        subscriber_id = simple_subscription.subscriber_id
+        assert await wrapper(client.subscription_client().exists(subscriber_ids=subscriber_id))
+        assert not await wrapper(client.subscription_client().exists(subscriber_ids="NotExistUserID"))
+
 
 class TestUpdateSubscription:
     @pytest.fixture()
@@ -148,6 +214,16 @@ class TestUpdateSubscription:
             paused.renew()
             await wrapper(client.subscription_client().update(paused))
 
+    @pytest.mark.asyncio
+    async def test_update_many_with_active_status_conflict(self, client, simple_subscription,
+                                                           two_subs_for_one_subscriber):
+        active, paused = two_subs_for_one_subscriber
+        simple_subscription.pause()
+        paused.resume()
+        result = await wrapper(client.subscription_client().update_many([simple_subscription, paused]))
+        assert [x.success for x in result] == [True, False]
+        assert isinstance(result.failed[0].error, ActiveStatusConflict)
+
     @pytest.mark.asyncio
     async def test_expire_subscription(self, client, simple_subscription):
         # Update
@@ -168,6 +244,19 @@ class TestUpdateSubscription:
         real: Subscription = await wrapper(client.subscription_client().get_by_id(subscription_with_usages.id))
         assert real.usages.get("api_call").used_units == 45
 
+    @pytest.mark.asyncio
+    async def test_increase_usage_on_server(self, client, subscription_with_usages):
+        await wrapper(client.subscription_client().increase_usage(subscription_with_usages.id, "api_call", 45))
+        await wrapper(client.subscription_client().increase_usages(subscription_with_usages.id, {"api_call": 5}))
+
+        real: Subscription = await wrapper(client.subscription_client().get_by_id(subscription_with_usages.id))
+        assert real.usages.get("api_call").used_units == 50
+
+    @pytest.mark.asyncio
+    async def test_increase_unknown_usage(self, client, subscription_with_usages):
+        with pytest.raises(ItemNotExist):
+            await wrapper(client.subscription_client().increase_usage(subscription_with_usages.id, "unknown", 1))
+
     @pytest.mark.asyncio
     async def test_add_usages(self, client, simple_subscription):
         # Update